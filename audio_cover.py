@@ -0,0 +1,141 @@
+import asyncio
+import logging
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Audio Cover Extraction
+# =========================
+# Embedded art lives in the file's metadata: the ID3 tag at the start of an
+# MP3, the FLAC metadata blocks, or the MP4 `moov` atom (which may sit at the
+# end of the file). Only the chunks covering that metadata are streamed from
+# Telegram, and mutagen parses them from memory in a worker thread. mutagen
+# is imported on first use so it stays off the startup path.
+
+CHUNK_SIZE = 1024 * 1024  # stream_media always yields 1 MiB chunks
+MAX_METADATA_CHUNKS = 8   # covers above this size are skipped
+
+class MetadataTooLarge(Exception):
+    pass
+
+class ChunkReader:
+    """Random access to a Telegram file, fetching and keeping only the chunks that are read."""
+
+    def __init__(self, bot, message, file_size):
+        self.bot = bot
+        self.message = message
+        self.file_size = file_size
+        self.chunks = {}
+
+    async def read(self, start, end):
+        end = min(end, self.file_size)
+        if start >= end:
+            return b""
+        first, last = start // CHUNK_SIZE, (end - 1) // CHUNK_SIZE
+        missing = [index for index in range(first, last + 1) if index not in self.chunks]
+        if len(self.chunks) + len(missing) > MAX_METADATA_CHUNKS:
+            raise MetadataTooLarge(f"metadata spans more than {MAX_METADATA_CHUNKS} chunks")
+        if missing:
+            index = missing[0]
+            async for chunk in self.bot.stream_media(self.message, offset=index, limit=missing[-1] - index + 1):
+                self.chunks[index] = chunk
+                index += 1
+        data = b"".join(self.chunks[index] for index in range(first, last + 1))
+        base = first * CHUNK_SIZE
+        return data[start - base:end - base]
+
+def _syncsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+async def _read_id3(reader):
+    header = await reader.read(0, 10)
+    footer = 10 if header[5] & 0x10 else 0
+    return await reader.read(0, 10 + _syncsafe(header[6:10]) + footer)
+
+async def _read_flac(reader):
+    pos = 4
+    while True:
+        header = await reader.read(pos, pos + 4)
+        if len(header) < 4:
+            return None
+        pos += 4 + int.from_bytes(header[1:4], "big")
+        if header[0] & 0x80:  # last metadata block
+            return await reader.read(0, pos)
+
+async def _read_mp4(reader):
+    """Returns the `ftyp` and `moov` atoms back to back, which is all mutagen needs for tags."""
+    atoms = {}
+    pos = 0
+    while pos < reader.file_size and "moov" not in atoms:
+        header = await reader.read(pos, pos + 16)
+        if len(header) < 8:
+            break
+        size = int.from_bytes(header[:4], "big")
+        kind = header[4:8].decode("latin-1")
+        if size == 1:
+            size = int.from_bytes(header[8:16], "big")
+        elif size == 0:
+            size = reader.file_size - pos
+        if size < 8:
+            break
+        if kind in ("ftyp", "moov"):
+            atoms[kind] = await reader.read(pos, pos + size)
+        pos += size
+    if "moov" not in atoms:
+        return None
+    return atoms.get("ftyp", b"") + atoms["moov"]
+
+def _cover_from_id3(data):
+    from mutagen.id3 import ID3, APIC
+    for frame in ID3(BytesIO(data)).getall("APIC"):
+        if isinstance(frame, APIC) and frame.data:
+            return frame.data
+    return None
+
+def _cover_from_flac(data):
+    from mutagen.flac import FLAC
+    pictures = FLAC(BytesIO(data)).pictures
+    return pictures[0].data if pictures else None
+
+def _cover_from_mp4(data):
+    from mutagen.mp4 import MP4
+    tags = MP4(BytesIO(data)).tags
+    if tags and "covr" in tags:
+        return bytes(tags["covr"][0])
+    return None
+
+def _detect(head):
+    if head[:3] == b"ID3":
+        return _read_id3, _cover_from_id3
+    if head[:4] == b"fLaC":
+        return _read_flac, _cover_from_flac
+    if head[4:8] == b"ftyp":
+        return _read_mp4, _cover_from_mp4
+    return None, None
+
+async def extract_audio_cover(bot, message):
+    """
+    Returns the embedded cover of an audio message as an in-memory JPEG/PNG
+    (a named BytesIO ready for send_photo), or None if it has none.
+    """
+    audio = message.audio
+    if not audio or not audio.file_size:
+        return None
+    reader = ChunkReader(bot, message, audio.file_size)
+    try:
+        read_metadata, parse_cover = _detect(await reader.read(0, 12))
+        if not read_metadata:
+            return None
+        metadata = await read_metadata(reader)
+        if not metadata:
+            return None
+        cover = await asyncio.to_thread(parse_cover, metadata)
+    except MetadataTooLarge as e:
+        logger.warning(f"Skipping cover for {audio.file_name}: {e}")
+        return None
+    if not cover:
+        return None
+    photo = BytesIO(cover)
+    photo.name = "cover.png" if cover[:8] == b"\x89PNG\r\n\x1a\n" else "cover.jpg"
+    return photo
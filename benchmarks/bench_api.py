@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the catalog API against synthetic catalogs.
+
+Seeds a Mongo database with generated tmdb, files, genres, stars, directors
+and comments data for each catalog size, then drives /api/media (every sort
+and filter), /api/media/{id}, season files, /api/others and comments through
+the ASGI app in-process (httpx.ASGITransport, no network or uvicorn) at
+several concurrency levels, and reports p50/p95/p99 latency and requests/s.
+
+Needs a local mongod (e.g. `docker run -p 27017:27017 mongo:7`) and httpx.
+The target database is dropped and reseeded whenever the seeded size does
+not match, so it must not be the bot's own database. Atlas Search is not
+available locally, so searches in /api/others are not benchmarked.
+
+By default response cache lookups are bypassed so every request reaches
+Mongo; pass --cached to measure with the cache in place.
+
+Usage:
+    python benchmarks/bench_api.py [--sizes 10k,100k,1m] [--concurrency 1,10,50]
+                                   [--requests 200] [--workloads media_recent,others]
+                                   [--mongo-uri mongodb://localhost:27017]
+                                   [--database sharing_bot_bench] [--reseed] [--cached]
+                                   [--json results.json] [--save-baseline [PATH]]
+                                   [--compare [PATH]]
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+from datetime import datetime, timezone, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "benchmarks", "api_baseline.json")
+SEED_VERSION = 1
+FILES_PER_TITLE = 10
+OTHERS_SHARE = 0.1    # files outside the TMDB channels
+SUBTITLE_SHARE = 0.05  # .srt files, filtered out by the file listings
+TV_SHARE = 0.3
+SEASONS_PER_SHOW = 5
+INSERT_BATCH = 10_000
+OWNER_ID = 1
+TMDB_CHANNEL = -1001000000001
+OTHERS_CHANNEL = -1001000000002
+
+GENRES = [
+    "Action", "Adventure", "Animation", "Comedy", "Crime", "Documentary", "Drama", "Family",
+    "Fantasy", "History", "Horror", "Music", "Mystery", "Romance", "Science Fiction",
+    "Thriller", "War", "Western", "Kids",
+]
+WORDS = [
+    "dark", "night", "city", "last", "lost", "king", "river", "storm", "house", "road",
+    "star", "dead", "blood", "secret", "world", "girl", "man", "war", "fire", "ghost",
+    "ocean", "winter", "empire", "shadow", "dream", "game", "heart", "iron", "silent", "wild",
+]
+QUALITIES = ["480p", "720p", "1080p", "2160p"]
+SOURCES = ["WEB-DL", "BluRay", "HDRip", "WEBRip"]
+
+def parse_size(text):
+    text = text.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+def format_size(size):
+    if size >= 1_000_000 and size % 1_000_000 == 0:
+        return f"{size // 1_000_000}m"
+    if size >= 1_000 and size % 1_000 == 0:
+        return f"{size // 1_000}k"
+    return str(size)
+
+def configure_environment(args):
+    """
+    Points the app at the benchmark database before any repo module is imported.
+    config.py loads ./config.env over the environment, so run from an empty directory.
+    """
+    workdir = tempfile.mkdtemp(prefix="bench_api_")
+    os.chdir(workdir)
+    os.environ.pop("CONFIG_FILE_URL", None)
+    os.environ.update({
+        "MONGO_URI": args.mongo_uri,
+        "DATABASE_NAME": args.database,
+        "OWNER_ID": str(OWNER_ID),
+        "TMDB_CHANNEL_ID": str(TMDB_CHANNEL),
+        "POSTER_CACHE_DIR": os.path.join(workdir, "poster_cache"),
+        "WARMUP_ENABLED": "False",
+        "POSTER_PREWARM": "False",
+    })
+    for name, value in {
+        "API_ID": "1", "API_HASH": "bench", "BOT_TOKEN": "1:bench", "LOG_CHANNEL_ID": "-1",
+        "MY_DOMAIN": "http://localhost:8000",
+    }.items():
+        os.environ.setdefault(name, value)
+
+# =========================
+# Synthetic Catalog
+# =========================
+
+class Catalog:
+    """Ids the workloads pick from, derived from the seeded data."""
+
+    def __init__(self, titles, genre_ids, star_ids, director_ids):
+        self.titles = titles
+        self.movie_ids = [tmdb_id for tmdb_id in range(1, titles + 1) if not is_tv(tmdb_id)]
+        self.tv_ids = [tmdb_id for tmdb_id in range(1, titles + 1) if is_tv(tmdb_id)]
+        self.genre_ids = genre_ids
+        self.star_ids = star_ids
+        self.director_ids = director_ids
+
+def is_tv(tmdb_id):
+    return tmdb_id % 10 < TV_SHARE * 10
+
+def title_of(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title()
+
+async def seed(db, size, rng):
+    """Drops and refills the benchmark collections with `size` files."""
+    for name in ("tmdb", "files", "genres", "stars", "directors", "languages", "comments", "bench_meta"):
+        await db[name].drop()
+
+    titles = max(1, int(size * (1 - OTHERS_SHARE)) // FILES_PER_TITLE)
+    genre_ids = (await db.genres.insert_many([{"name": name} for name in GENRES])).inserted_ids
+    star_count = max(1000, titles // 5)
+    star_ids = []
+    for start in range(0, star_count, INSERT_BATCH):
+        docs = [
+            {"name": f"Star {i}", "profile_path": f"/star{i}.jpg"}
+            for i in range(start, min(start + INSERT_BATCH, star_count))
+        ]
+        star_ids.extend((await db.stars.insert_many(docs)).inserted_ids)
+    director_count = max(200, titles // 20)
+    director_ids = (await db.directors.insert_many(
+        [{"name": f"Director {i}", "profile_path": None} for i in range(director_count)]
+    )).inserted_ids
+
+    # Titles, inserted oldest first so _id order matches "recent"
+    names = {}
+    batch = []
+    for tmdb_id in range(1, titles + 1):
+        tmdb_type = "tv" if is_tv(tmdb_id) else "movie"
+        title = title_of(rng)
+        year = rng.randint(1960, 2025)
+        names[tmdb_id] = (title, year)
+        doc = {
+            "tmdb_id": tmdb_id,
+            "tmdb_type": tmdb_type,
+            "title": title,
+            "year": year,
+            "rating": round(rng.uniform(1, 9.9), 1),
+            "plot": " ".join(rng.choice(WORDS) for _ in range(40)),
+            "poster_path": f"/poster{tmdb_id}.jpg",
+            "trailer_url": None,
+            "imdb_id": f"tt{tmdb_id:07d}",
+            "genres": rng.sample(genre_ids, rng.randint(1, 3)),
+            "cast": rng.sample(star_ids, 5),
+            "directors": [rng.choice(director_ids)],
+            "spoken_languages": [],
+            "runtime": rng.randint(20, 180),
+        }
+        if tmdb_type == "tv":
+            doc["seasons"] = [
+                {"season_number": season, "episode_count": FILES_PER_TITLE}
+                for season in range(1, SEASONS_PER_SHOW + 1)
+            ]
+        batch.append(doc)
+        if len(batch) >= INSERT_BATCH:
+            await db.tmdb.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.tmdb.insert_many(batch, ordered=False)
+
+    # Files, in posting order
+    now = datetime.now(timezone.utc)
+    batch = []
+    for message_id in range(1, size + 1):
+        quality = rng.choice(QUALITIES)
+        file = {
+            "message_id": message_id,
+            "file_size": rng.randint(100, 4000) * 1024 * 1024,
+            "file_format": "video/x-matroska",
+            "date": now - timedelta(seconds=size - message_id),
+        }
+        tmdb_id = rng.randint(1, titles) if rng.random() >= OTHERS_SHARE else None
+        if tmdb_id is None:
+            file["channel_id"] = OTHERS_CHANNEL
+            file["file_name"] = f"{title_of(rng).replace(' ', '.')}.{quality}.mkv"
+            file["poster_url"] = f"https://i.ibb.co/bench/{message_id}.jpg"
+        else:
+            title, year = names[tmdb_id]
+            stem = title.replace(" ", ".")
+            file["channel_id"] = TMDB_CHANNEL
+            file["tmdb_id"] = tmdb_id
+            if is_tv(tmdb_id):
+                season = rng.randint(1, SEASONS_PER_SHOW)
+                episode = rng.randint(1, FILES_PER_TITLE)
+                file["tmdb_type"] = "tv"
+                file["season_number"] = season
+                file["file_name"] = f"{stem}.S{season:02d}E{episode:02d}.{quality}.{rng.choice(SOURCES)}.mkv"
+            else:
+                file["tmdb_type"] = "movie"
+                file["file_name"] = f"{stem}.{year}.{quality}.{rng.choice(SOURCES)}.x264.mkv"
+            if rng.random() < SUBTITLE_SHARE:
+                file["file_name"] = file["file_name"][:-4] + ".srt"
+        batch.append(file)
+        if len(batch) >= INSERT_BATCH:
+            await db.files.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.files.insert_many(batch, ordered=False)
+
+    await db.comments.insert_many([
+        {"user_name": f"User {i}", "comment": " ".join(rng.choice(WORDS) for _ in range(12)), "created_at": now - timedelta(minutes=i)}
+        for i in range(500, 0, -1)
+    ])
+    await db.bench_meta.insert_one({"_id": "seed", "files": size, "titles": titles, "version": SEED_VERSION})
+
+async def prepare_catalog(db, size, seed_value, reseed):
+    meta = await db.bench_meta.find_one({"_id": "seed"})
+    if reseed or not meta or meta.get("files") != size or meta.get("version") != SEED_VERSION:
+        started = time.perf_counter()
+        print(f"Seeding {format_size(size)} files into {db.name} ...", flush=True)
+        await seed(db, size, random.Random(f"{seed_value}:{size}"))
+        print(f"Seeded in {time.perf_counter() - started:.1f}s", flush=True)
+        meta = await db.bench_meta.find_one({"_id": "seed"})
+    return Catalog(
+        meta["titles"],
+        [doc["_id"] async for doc in db.genres.find({}, {"_id": 1})],
+        [doc["_id"] async for doc in db.stars.find({}, {"_id": 1}).limit(5000)],
+        [doc["_id"] async for doc in db.directors.find({}, {"_id": 1}).limit(5000)],
+    )
+
+# =========================
+# Workloads
+# =========================
+# Each returns the URL of one request; pages lean towards the first ones,
+# like real browsing.
+
+def page(rng, pages=20):
+    return min(pages, int(rng.expovariate(0.5)) + 1)
+
+WORKLOADS = {
+    "media_recent": lambda rng, c: f"/api/media?category={rng.choice(['movie', 'tv'])}&sort=recent&page={page(rng)}",
+    "media_rating": lambda rng, c: f"/api/media?category={rng.choice(['movie', 'tv'])}&sort=rating&page={page(rng)}",
+    "media_year": lambda rng, c: f"/api/media?category={rng.choice(['movie', 'tv'])}&sort=year&page={page(rng)}",
+    "media_genre": lambda rng, c: f"/api/media?genre={rng.choice(c.genre_ids)}&sort=recent&page={page(rng)}",
+    "media_cast": lambda rng, c: f"/api/media?cast={rng.choice(c.star_ids)}&sort=year",
+    "media_director": lambda rng, c: f"/api/media?director={rng.choice(c.director_ids)}&sort=year",
+    "media_search": lambda rng, c: f"/api/media?search={rng.choice(WORDS)}&sort=recent&page={page(rng, 5)}",
+    "details_movie": lambda rng, c: f"/api/media/{rng.choice(c.movie_ids)}?tmdb_type=movie",
+    "details_tv": lambda rng, c: f"/api/media/{rng.choice(c.tv_ids)}?tmdb_type=tv",
+    "season_files": lambda rng, c: f"/api/media/{rng.choice(c.tv_ids)}/season/{rng.randint(1, SEASONS_PER_SHOW)}",
+    "others": lambda rng, c: f"/api/others?sort={rng.choice(['recent', 'oldest'])}&page={page(rng)}",
+    "comments": lambda rng, c: f"/api/comments?page={page(rng, 10)}",
+}
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+async def run_workload(client, urls, concurrency):
+    latencies = []
+    errors = 0
+    pending = iter(urls)
+
+    async def worker():
+        nonlocal errors
+        for url in pending:
+            started = time.perf_counter()
+            response = await client.get(url)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(urls),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "rps": round(len(urls) / elapsed, 1),
+    }
+
+# =========================
+# Baselines
+# =========================
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\nCompared with {baseline_path} (negative latency / positive rps change is better)")
+    print(f"{'case':<36} {'p50':>16} {'p95':>16} {'p99':>16} {'rps':>18}")
+
+    def change(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    for case, result in results.items():
+        old = baseline.get(case)
+        if not old:
+            print(f"{case:<36} (not in baseline)")
+            continue
+        print(
+            f"{case:<36} "
+            f"{result['p50_ms']:>7.1f} {change(result['p50_ms'], old['p50_ms']):>8} "
+            f"{result['p95_ms']:>7.1f} {change(result['p95_ms'], old['p95_ms']):>8} "
+            f"{result['p99_ms']:>7.1f} {change(result['p99_ms'], old['p99_ms']):>8} "
+            f"{result['rps']:>9.1f} {change(result['rps'], old['rps']):>8}"
+        )
+
+async def run(args):
+    # Imported here, once the environment points at the benchmark database
+    import httpx
+    import fast_api
+    from bot import init_database
+    from cache import cache
+    from db import db
+    from db_monitor import command_monitor
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("db_monitor").setLevel(logging.ERROR)
+    if not args.cached:
+        # Every request should reach Mongo, not the response cache
+        cache.get = lambda key, default=None: default
+
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    levels = [int(level) for level in args.concurrency.split(",")]
+    workloads = args.workloads.split(",") if args.workloads else list(WORKLOADS)
+    unknown = [name for name in workloads if name not in WORKLOADS]
+    if unknown:
+        raise SystemExit(f"Unknown workloads: {', '.join(unknown)}")
+
+    results = {}
+    transport = httpx.ASGITransport(app=fast_api.api, raise_app_exceptions=False)
+    headers = {"Authorization": f"Bearer {OWNER_ID}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers, timeout=None) as client:
+        for size in sizes:
+            catalog = await prepare_catalog(db, size, args.seed, args.reseed)
+            await init_database()
+            command_monitor.shapes.clear()
+            print(f"\n{format_size(size)} files, {catalog.titles} titles")
+            print(f"{'workload':<16} {'conc':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'errors':>7}")
+            for name in workloads:
+                for level in levels:
+                    rng = random.Random(f"{args.seed}:{name}:{level}")
+                    urls = [WORKLOADS[name](rng, catalog) for _ in range(args.requests)]
+                    # One untimed pass of the first requests warms connections and plans
+                    await run_workload(client, urls[:min(10, len(urls))], 1)
+                    result = await run_workload(client, urls, level)
+                    results[f"{format_size(size)}/{name}/c{level}"] = result
+                    print(
+                        f"{name:<16} {level:>5} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+                        f"{result['p99_ms']:>9.2f} {result['rps']:>9.1f} {result['errors']:>7}"
+                    )
+            shapes = command_monitor.top_shapes(5, "total")
+            if shapes:
+                print("\nSlowest query shapes:")
+            for shape in shapes:
+                print(f"  {shape['total_ms']:>10.1f} ms total, {shape['max_ms']:>8.1f} ms max  "
+                      f"{shape['command']} {shape['collection']} {shape['shape']}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10k", help="comma separated catalog sizes in files, e.g. 10k,100k,1m")
+    parser.add_argument("--concurrency", default="1,10,50", help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per workload and concurrency level")
+    parser.add_argument("--workloads", help=f"comma separated subset of: {', '.join(WORKLOADS)}")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="sharing_bot_bench", help="dropped and reseeded, never the bot's own")
+    parser.add_argument("--seed", default="bench", help="random seed for the catalog and the request mix")
+    parser.add_argument("--reseed", action="store_true", help="reseed even if the database already holds this size")
+    parser.add_argument("--cached", action="store_true", help="keep the response cache in place")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="save results as the baseline")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, help="compare results with a saved baseline")
+    args = parser.parse_args()
+
+    if args.database == "sharing_bot":
+        raise SystemExit("Refusing to reseed the bot's own database, pick another --database")
+    # The run happens in a scratch directory, see configure_environment
+    for option in ("json", "save_baseline", "compare"):
+        if getattr(args, option):
+            setattr(args, option, os.path.abspath(getattr(args, option)))
+    if args.compare and not os.path.exists(args.compare):
+        raise SystemExit(f"No baseline at {args.compare}, create one with --save-baseline first")
+
+    configure_environment(args)
+    results = asyncio.run(run(args))
+
+    report = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "sizes": args.sizes,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "cached": args.cached,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    # Compare first, the new baseline may replace the one compared against
+    if args.compare:
+        compare(results, args.compare)
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"\nResults written to {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the filename parsing pipeline.
+
+Runs every name in filenames.txt through clean_file_name + parse_title,
+repeated to mimic release groups posting the same naming shapes over and over.
+
+Usage:
+    python benchmarks/bench_parsing.py [--repeat 50] [--json results.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filename_parser import clean_file_name, parse_title, parse_titles, parse_cache_info
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "filenames.txt")
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+def clear_caches():
+    clean_file_name.cache_clear()
+    parse_title.cache_clear()
+
+def timed(label, func, count):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    per_item_us = elapsed / count * 1e6
+    print(f"{label:<28} {elapsed * 1000:10.2f} ms  {per_item_us:9.2f} us/name  {count / elapsed:12.0f} names/s")
+    return {"seconds": elapsed, "us_per_name": per_item_us}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50, help="how many times the corpus is repeated")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    workload = corpus * args.repeat
+    cleaned = [clean_file_name(name) for name in corpus]
+    clear_caches()
+
+    print(f"{len(corpus)} unique names, {len(workload)} per run\n")
+    results = {}
+
+    # Every name parsed from scratch, precompiled patterns only
+    results["uncached"] = timed(
+        "uncached pipeline",
+        lambda: [parse_title.__wrapped__(clean_file_name.__wrapped__(name)) for name in workload],
+        len(workload),
+    )
+
+    clear_caches()
+    results["memoized_cold"] = timed(
+        "memoized (cold cache)",
+        lambda: [parse_title(clean_file_name(name)) for name in workload],
+        len(workload),
+    )
+
+    results["memoized_warm"] = timed(
+        "memoized (warm cache)",
+        lambda: [parse_title(clean_file_name(name)) for name in workload],
+        len(workload),
+    )
+
+    clear_caches()
+    results["batch_cold"] = timed(
+        "parse_titles batch (cold)",
+        lambda: parse_titles(cleaned * args.repeat),
+        len(workload),
+    )
+
+    print(f"\ncache: {parse_cache_info()}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"names": len(workload), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
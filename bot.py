@@ -1,44 +1,99 @@
 
+import time
+STARTED = time.perf_counter()
+
 import asyncio
 import uvicorn
 import logging
 
 from app import bot
 from db import files_col
-from utility import file_queue_worker, periodic_expiry_cleanup
+from utility import periodic_expiry_cleanup, load_allowed_channels, periodic_allowed_channels_refresh
+from ingest_queue import file_queue_worker, restore_file_queue, periodic_lease_check
+from ingest_jobs import restore_jobs, periodic_job_flush
+from dimensions import init_dimensions
+from broadcast import resume_broadcasts
+from posters import ensure_poster_indexes
+from poster_cache import poster_cache
+from comments import load_comments
+from warmup import warm_caches
 from fast_api import api
-from config import LOG_CHANNEL_ID
+from config import LOG_CHANNEL_ID, WARMUP_ENABLED
 from handlers import owner, user
 
-async def main():
+phase_times = {}
+
+async def timed(phase, coro):
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        phase_times[phase] = time.perf_counter() - started
+
+async def init_database():
     """
-    Starts the bot and FastAPI server.
+    Ensures indexes and loads the state kept in Mongo.
     """
     index_names = [index['name'] async for index in files_col.list_indexes()]
     if "file_name_text" not in index_names:
         await files_col.create_index([("file_name", "text")])
+    await asyncio.gather(
+        init_dimensions(),
+        load_allowed_channels(),
+        load_comments(),
+        ensure_poster_indexes(),
+        asyncio.to_thread(poster_cache.load),
+    )
+    await restore_jobs()
+    await restore_file_queue()
 
-    await bot.start()
+async def main():
+    """
+    Starts the bot and FastAPI server.
+    """
+    phase_times["imports"] = time.perf_counter() - STARTED
+
+    # Channel handlers need the allowed channels and restored queue before the
+    # bot receives updates, and the send routes need a connected bot
+    await timed("mongo", init_database())
+    await timed("telegram", bot.start())
+    server = uvicorn.Server(uvicorn.Config(api, host="0.0.0.0", port=8000, loop="asyncio", log_level="warning"))
+    server_task = bot.loop.create_task(start_fastapi(server))
+    await timed("http", wait_for_server(server, server_task))
 
-    bot.loop.create_task(start_fastapi())
     bot.loop.create_task(file_queue_worker(bot))
+    bot.loop.create_task(periodic_lease_check())
+    bot.loop.create_task(periodic_job_flush())
     bot.loop.create_task(periodic_expiry_cleanup())
+    bot.loop.create_task(periodic_allowed_channels_refresh())
+    if WARMUP_ENABLED:
+        bot.loop.create_task(warm_caches())
+    await resume_broadcasts(bot)
+
+    total = time.perf_counter() - STARTED
+    phases = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in phase_times.items())
+    logging.info(f"Startup took {total:.2f}s ({phases})")
 
     try:
         me = await bot.get_me()
         user_name = me.username or "Bot"
-        await bot.send_message(LOG_CHANNEL_ID, f"✅ @{user_name} started and FastAPI server running.")
+        await bot.send_message(LOG_CHANNEL_ID, f"✅ @{user_name} started and FastAPI server running in {total:.1f}s.")
         logging.info("Bot started and FastAPI server running.")
     except Exception as e:
         print(f"Failed to send startup message to log channel: {e}")
 
-async def start_fastapi():
+async def wait_for_server(server, server_task):
+    """
+    Returns once Uvicorn accepts connections, or has given up trying.
+    """
+    while not server.started and not server_task.done():
+        await asyncio.sleep(0.05)
+
+async def start_fastapi(server):
     """
-    Starts the FastAPI server using Uvicorn.
+    Runs the FastAPI server using Uvicorn.
     """
     try:
-        config = uvicorn.Config(api, host="0.0.0.0", port=8000, loop="asyncio", log_level="warning")
-        server = uvicorn.Server(config)
         await server.serve()
     except KeyboardInterrupt:
         pass
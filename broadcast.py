@@ -0,0 +1,210 @@
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from pyrogram.errors import UserIsBlocked, InputUserDeactivated, PeerIdInvalid, UserIsBot
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from db import users_col, broadcasts_col
+from utility import safe_api_call
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Broadcast Engine
+# =========================
+# Users are streamed from a cursor in _id order and sent to in chunks by a
+# pool of workers; pacing is left to the send scheduler. After every chunk,
+# dead users are removed with one delete_many and progress is checkpointed
+# in `broadcasts_col`, so a restart resumes after the last finished chunk.
+
+BROADCAST_WORKERS = 20
+CHUNK_SIZE = 200
+STATUS_INTERVAL_SECONDS = 15
+
+STATE_RUNNING = "running"
+STATE_CANCELLED = "cancelled"
+STATE_FINISHED = "finished"
+
+CANCEL_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("Cancel", callback_data="cancel_broadcast")]])
+
+current_broadcast = None
+
+class Broadcast:
+    def __init__(self, bot, doc):
+        self.bot = bot
+        self.doc = doc
+        self.cancelled = False
+        self.message = None
+        self.last_status = 0.0
+        self.resumed_at = time.monotonic()
+        self.sent_since_resume = 0
+
+    @property
+    def counts(self):
+        return {key: self.doc.get(key, 0) for key in ("sent", "failed", "removed")}
+
+    def status_text(self, header):
+        counts = self.counts
+        elapsed = time.monotonic() - self.resumed_at
+        rate = self.sent_since_resume / elapsed if elapsed > 0 else 0.0
+        return (
+            f"{header}\n\n"
+            f"👥 Total Users: {self.doc.get('total', 0)}\n"
+            f"✅ Sent: {counts['sent']}\n"
+            f"❌ Failed: {counts['failed']}\n"
+            f"🗑️ Removed: {counts['removed']}\n"
+            f"⚡ Speed: {rate:.1f} users/s"
+        )
+
+    async def update_status(self, header, final=False):
+        self.last_status = time.monotonic()
+        await safe_api_call(lambda: self.bot.edit_message_text(
+            self.doc["status_chat_id"],
+            self.doc["status_message_id"],
+            self.status_text(header),
+            reply_markup=None if final else CANCEL_MARKUP,
+        ))
+
+    async def send_to(self, user_id):
+        msg = self.message
+        try:
+            if self.doc.get("now_available"):
+                caption = msg.caption.html if msg.caption else ""
+                result = await safe_api_call(lambda: msg.copy(
+                    chat_id=user_id,
+                    caption=f"{caption}\n\n✅ <b>Now Available!</b>",
+                    reply_markup=msg.reply_markup
+                ), chat_id=user_id)
+            else:
+                result = await safe_api_call(lambda: msg.copy(user_id), chat_id=user_id)
+            return "sent" if result else "failed"
+        except (UserIsBlocked, InputUserDeactivated, PeerIdInvalid, UserIsBot):
+            return "removed"
+        except Exception as e:
+            logger.error(f"Error broadcasting to {user_id}: {e}")
+            return "failed"
+
+    async def run_chunk(self, users):
+        semaphore = asyncio.Semaphore(BROADCAST_WORKERS)
+
+        async def worker(user_id):
+            async with semaphore:
+                return user_id, await self.send_to(user_id)
+
+        results = await asyncio.gather(*(worker(user["user_id"]) for user in users))
+        counts = {"sent": 0, "failed": 0, "removed": 0}
+        dead_users = []
+        for user_id, outcome in results:
+            counts[outcome] += 1
+            if outcome == "removed":
+                dead_users.append(user_id)
+
+        if dead_users:
+            await users_col.delete_many({"user_id": {"$in": dead_users}})
+
+        # Checkpoint: everything up to the last _id of this chunk is done
+        for key, value in counts.items():
+            self.doc[key] = self.doc.get(key, 0) + value
+        self.doc["last_user_id"] = users[-1]["_id"]
+        self.sent_since_resume += len(users)
+        await broadcasts_col.update_one(
+            {"_id": self.doc["_id"]},
+            {"$set": {"last_user_id": self.doc["last_user_id"], "updated_at": datetime.now(timezone.utc)},
+             "$inc": counts},
+        )
+
+    async def run(self):
+        global current_broadcast
+        current_broadcast = self
+        try:
+            self.message = await safe_api_call(lambda: self.bot.get_messages(
+                self.doc["source_chat_id"], self.doc["source_message_id"]
+            ))
+            if not self.message or self.message.empty:
+                raise ValueError("Broadcast message no longer exists")
+
+            query = {"_id": {"$gt": self.doc["last_user_id"]}} if self.doc.get("last_user_id") else {}
+            cursor = users_col.find(query, {"user_id": 1}).sort("_id", 1).batch_size(CHUNK_SIZE)
+
+            chunk = []
+            async for user in cursor:
+                chunk.append(user)
+                if len(chunk) < CHUNK_SIZE:
+                    continue
+                await self.run_chunk(chunk)
+                chunk = []
+                if self.cancelled:
+                    break
+                if time.monotonic() - self.last_status >= STATUS_INTERVAL_SECONDS:
+                    await self.update_status("📢 Broadcast in progress...")
+            if chunk and not self.cancelled:
+                await self.run_chunk(chunk)
+
+            state = STATE_CANCELLED if self.cancelled else STATE_FINISHED
+            await broadcasts_col.update_one(
+                {"_id": self.doc["_id"]},
+                {"$set": {"state": state, "finished_at": datetime.now(timezone.utc)}},
+            )
+            header = "📢 <b>Broadcast cancelled.</b>" if self.cancelled else "✅ <b>Broadcast finished!</b>"
+            await self.update_status(header, final=True)
+            logger.info(f"Broadcast {self.doc['_id']} {state}: {self.counts}")
+        except Exception as e:
+            logger.error(f"Broadcast {self.doc['_id']} stopped: {e}")
+            await broadcasts_col.update_one(
+                {"_id": self.doc["_id"]},
+                {"$set": {"state": STATE_CANCELLED, "error": str(e)}},
+            )
+        finally:
+            current_broadcast = None
+
+def is_broadcasting():
+    return current_broadcast is not None
+
+def cancel_broadcast():
+    if current_broadcast is None:
+        return False
+    current_broadcast.cancelled = True
+    return True
+
+async def start_broadcast(bot, command_message, source_message):
+    """Creates a broadcast for `source_message` and runs it in the background."""
+    total = await users_col.estimated_document_count()
+    status_message = await safe_api_call(lambda: command_message.reply_text(
+        f"📢 Broadcast in progress...\n\n👥 Total Users: {total}",
+        reply_markup=CANCEL_MARKUP,
+    ))
+    if status_message is None:
+        # safe_api_call already logged why; without a status message there is nothing to report progress on
+        await safe_api_call(lambda: command_message.reply_text("❌ Could not start the broadcast, try again later."))
+        return
+    doc = {
+        "source_chat_id": source_message.chat.id,
+        "source_message_id": source_message.id,
+        "now_available": bool(source_message.forward_from_chat),
+        "status_chat_id": status_message.chat.id,
+        "status_message_id": status_message.id,
+        "state": STATE_RUNNING,
+        "total": total,
+        "sent": 0,
+        "failed": 0,
+        "removed": 0,
+        "last_user_id": None,
+        "started_at": datetime.now(timezone.utc),
+    }
+    result = await broadcasts_col.insert_one(doc)
+    doc["_id"] = result.inserted_id
+    broadcast = Broadcast(bot, doc)
+    # Claim the slot before the task starts so a second /broadcast is refused
+    global current_broadcast
+    current_broadcast = broadcast
+    asyncio.create_task(broadcast.run())
+
+async def resume_broadcasts(bot):
+    """Resumes the broadcast that was running when the process stopped, if any."""
+    doc = await broadcasts_col.find_one({"state": STATE_RUNNING}, sort=[("started_at", -1)])
+    if not doc:
+        return
+    logger.info(f"Resuming broadcast {doc['_id']} after {doc.get('sent', 0)} sent.")
+    global current_broadcast
+    current_broadcast = Broadcast(bot, doc)
+    asyncio.create_task(current_broadcast.run())
@@ -1,7 +1,51 @@
 from cachetools import TTLCache
+from metrics import Gauge, cache_hits, cache_misses, cache_evictions
+
+_MISSING = object()
+
+class MeteredTTLCache(TTLCache):
+    """TTLCache that counts hits, misses and evictions under `name`."""
+
+    def __init__(self, name, maxsize, ttl):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.name = name
+        self._clearing = False
+
+    def get(self, key, default=None):
+        value = super().get(key, _MISSING)
+        if value is _MISSING:
+            cache_misses.inc(cache=self.name)
+            return default
+        cache_hits.inc(cache=self.name)
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        if not self._clearing:
+            cache_evictions.inc(cache=self.name, reason="size")
+        return item
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        if expired:
+            cache_evictions.inc(len(expired), cache=self.name, reason="expired")
+        return expired
+
+    def clear(self):
+        # MutableMapping.clear() empties the cache through popitem()
+        count = len(self)
+        self._clearing = True
+        try:
+            super().clear()
+        finally:
+            self._clearing = False
+        if count:
+            cache_evictions.inc(count, cache=self.name, reason="invalidated")
 
 # Unified in-memory cache
-cache = TTLCache(maxsize=1000, ttl=300)
+cache = MeteredTTLCache("response", maxsize=1000, ttl=300)
+
+Gauge("cache_entries", "Entries currently held by a cache.", ("cache",), collect=lambda: {(cache.name,): len(cache)})
 
 def invalidate_cache():
     """Clears the entire in-memory cache."""
@@ -0,0 +1,116 @@
+import time
+import logging
+from collections import deque
+from datetime import datetime, timezone, timedelta
+from bson.objectid import ObjectId
+from pymongo.errors import OperationFailure
+from db import comments_col
+from config import COMMENT_RETENTION_DAYS
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Comments Feed
+# =========================
+# The newest RECENT_COMMENTS_SIZE comments live in a ring buffer that new
+# comments are appended to, so polling the first pages (or asking for
+# everything after a known id) never reaches Mongo. Older pages fall back to
+# the collection, which only keeps COMMENT_RETENTION_DAYS of comments.
+
+RECENT_COMMENTS_SIZE = 100
+COUNT_REFRESH_SECONDS = 5 * 60
+
+recent_comments = deque(maxlen=RECENT_COMMENTS_SIZE)  # oldest first
+comment_count = 0
+_count_refreshed = 0.0
+# The API starts serving while load_comments() still runs, until then
+# every read goes to Mongo
+buffer_loaded = False
+
+def _serialize(comment):
+    comment = dict(comment)
+    comment["_id"] = str(comment["_id"])
+    comment["first_name"] = comment["user_name"]
+    return comment
+
+def _retention_cutoff():
+    return datetime.now(timezone.utc) - timedelta(days=COMMENT_RETENTION_DAYS)
+
+def _live_recent():
+    """The buffer without comments the TTL index has removed by now, newest first."""
+    cutoff = _retention_cutoff()
+    return [
+        comment for comment in reversed(recent_comments)
+        if comment["created_at"].replace(tzinfo=timezone.utc) >= cutoff
+    ]
+
+async def _refresh_count():
+    global comment_count, _count_refreshed
+    comment_count = await comments_col.count_documents({})
+    _count_refreshed = time.monotonic()
+
+async def load_comments():
+    """Ensures the retention index and fills the buffer with the newest comments."""
+    global buffer_loaded
+    try:
+        await comments_col.create_index("created_at", expireAfterSeconds=COMMENT_RETENTION_DAYS * 24 * 60 * 60)
+    except OperationFailure as e:
+        logger.warning(f"Could not create the comments retention index: {e}")
+    latest = await comments_col.find().sort("_id", -1).limit(RECENT_COMMENTS_SIZE).to_list(length=RECENT_COMMENTS_SIZE)
+    recent_comments.clear()
+    recent_comments.extend(_serialize(comment) for comment in reversed(latest))
+    buffer_loaded = True
+    # Comments posted while the query ran were not appended by add_comment()
+    missed = await comments_col.find(
+        {"_id": {"$gt": latest[0]["_id"]}} if latest else {}
+    ).to_list(length=RECENT_COMMENTS_SIZE)
+    if missed:
+        merged = {comment["_id"]: comment for comment in recent_comments}
+        merged.update((str(comment["_id"]), _serialize(comment)) for comment in missed)
+        recent_comments.clear()
+        recent_comments.extend(sorted(merged.values(), key=lambda comment: ObjectId(comment["_id"])))
+    await _refresh_count()
+
+async def add_comment(user_name, text):
+    global comment_count
+    comment = {
+        "user_name": user_name,
+        "comment": text,
+        "created_at": datetime.now(timezone.utc)
+    }
+    result = await comments_col.insert_one(comment)
+    comment["_id"] = result.inserted_id
+    comment = _serialize(comment)
+    if buffer_loaded:
+        recent_comments.append(comment)
+        comment_count += 1
+    return comment
+
+async def get_total_pages(page_size):
+    # Expired comments disappear without a write, so resync the count now and then
+    if not buffer_loaded or time.monotonic() - _count_refreshed > COUNT_REFRESH_SECONDS:
+        await _refresh_count()
+    return (comment_count + page_size - 1) // page_size
+
+async def get_comments_page(page, page_size):
+    """Returns one page of comments, newest first."""
+    skip = (page - 1) * page_size
+    recent = _live_recent()
+    if buffer_loaded and (skip + page_size <= len(recent) or len(recent_comments) < RECENT_COMMENTS_SIZE):
+        # The buffer holds every comment when it is not full yet
+        return recent[skip:skip + page_size]
+    cursor = comments_col.find().sort("_id", -1).skip(skip).limit(page_size)
+    return [_serialize(comment) async for comment in cursor]
+
+async def get_comments_since(since_id, limit=RECENT_COMMENTS_SIZE):
+    """Returns comments newer than `since_id`, newest first."""
+    if not ObjectId.is_valid(since_id):
+        raise ValueError("Invalid comment id")
+    recent = _live_recent() if buffer_loaded else []
+    for index, comment in enumerate(recent):
+        if comment["_id"] == since_id:
+            return recent[:index][:limit]
+    if recent and ObjectId(since_id) >= ObjectId(recent[0]["_id"]):
+        return []
+    cursor = comments_col.find({"_id": {"$gt": ObjectId(since_id)}}).sort("_id", -1).limit(limit)
+    return [_serialize(comment) async for comment in cursor]
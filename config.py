@@ -1,10 +1,10 @@
 
 import os
+import time
 import logging
 from logging.handlers import RotatingFileHandler
 from dotenv import load_dotenv
 from os import environ
-from requests import get as rget
 
 # Logger setup
 LOG_FILE = "bot_log.txt"
@@ -28,11 +28,18 @@ logger = logging.getLogger("sharing_bot")
 logging.getLogger("pyrogram").setLevel(logging.ERROR)
 
 CONFIG_FILE_URL = environ.get('CONFIG_FILE_URL')
-try:
-    if len(CONFIG_FILE_URL) == 0:
-        raise TypeError
+CONFIG_FILE_TIMEOUT = float(environ.get('CONFIG_FILE_TIMEOUT', '10'))
+# update.py downloads config.env right before the bot starts, skip a second download
+CONFIG_FILE_MAX_AGE = int(environ.get('CONFIG_FILE_MAX_AGE', '600'))
+
+def download_config_file():
+    if not CONFIG_FILE_URL:
+        return
+    if os.path.exists('config.env') and time.time() - os.path.getmtime('config.env') < CONFIG_FILE_MAX_AGE:
+        return
+    from requests import get as rget
     try:
-        res = rget(CONFIG_FILE_URL)
+        res = rget(CONFIG_FILE_URL, timeout=CONFIG_FILE_TIMEOUT)
         if res.status_code == 200:
             with open('config.env', 'wb+') as f:
                 f.write(res.content)
@@ -40,8 +47,8 @@ try:
             logger.error(f"Failed to download config.env {res.status_code}")
     except Exception as e:
         logger.info(f"CONFIG_FILE_URL: {e}")
-except:
-    pass
+
+download_config_file()
 
 load_dotenv('config.env', override=True)
 
@@ -66,10 +73,20 @@ CF_DOMAINX = os.getenv('CF_DOMAINX')
 TOKEN_VALIDITY_SECONDS = 24 * 60 * 60  # 24 hours
 
 MONGO_URI = os.getenv("MONGO_URI")
+DATABASE_NAME = os.getenv("DATABASE_NAME") or "sharing_bot"
 
 TMDB_API_KEY = os.getenv('TMDB_API_KEY')
 IMGBB_API_KEY = os.getenv('IMGBB_API_KEY')
 
+#OUTBOUND RATE LIMITS (requests per second)
+TMDB_RATE_LIMIT = float(os.getenv('TMDB_RATE_LIMIT', '40'))
+IMDB_RATE_LIMIT = float(os.getenv('IMDB_RATE_LIMIT', '5'))
+
+#POSTER CACHE
+POSTER_CACHE_DIR = os.getenv('POSTER_CACHE_DIR', 'poster_cache')
+POSTER_CACHE_MAX_MB = int(os.getenv('POSTER_CACHE_MAX_MB', '512'))
+POSTER_PREWARM = os.getenv('POSTER_PREWARM', 'True').lower() in ('true', '1', 't')
+
 
 #SHORTERNER API
 URLSHORTX_API_TOKEN = os.getenv('URLSHORTX_API_TOKEN')
@@ -77,3 +94,21 @@ SHORTERNER_URL = os.getenv('SHORTERNER_URL')
 
 MAX_FILES_PER_SESSION = int(os.getenv("MAX_FILES_PER_SESSION", "10"))
 
+#Comments older than this many days are deleted
+COMMENT_RETENTION_DAYS = int(os.getenv('COMMENT_RETENTION_DAYS', '90'))
+
+#Seconds between reloads of the allowed channel list, 0 disables
+ALLOWED_CHANNELS_REFRESH_SECONDS = int(os.getenv('ALLOWED_CHANNELS_REFRESH_SECONDS', '600'))
+
+
+#STARTUP CACHE WARM-UP
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'True').lower() in ('true', '1', 't')
+WARMUP_PAGES = int(os.getenv('WARMUP_PAGES', '3'))
+WARMUP_TOP_TITLES = int(os.getenv('WARMUP_TOP_TITLES', '30'))
+WARMUP_CONCURRENCY = int(os.getenv('WARMUP_CONCURRENCY', '4'))
+
+#Bearer token required by /metrics, leave empty to serve it openly
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+#Mongo commands slower than this many milliseconds are logged
+MONGO_SLOW_QUERY_MS = int(os.getenv('MONGO_SLOW_QUERY_MS', '200'))
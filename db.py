@@ -1,10 +1,11 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from config import MONGO_URI
+from config import MONGO_URI, DATABASE_NAME
+from db_monitor import command_monitor
 
 
 # MongoDB setup
-mongo = AsyncIOMotorClient(MONGO_URI)
-db = mongo["sharing_bot"]
+mongo = AsyncIOMotorClient(MONGO_URI, event_listeners=[command_monitor])
+db = mongo[DATABASE_NAME]
 files_col = db["files"]
 tmdb_col = db["tmdb"]
 tokens_col = db["tokens"]
@@ -16,6 +17,10 @@ genres_col = db["genres"]
 stars_col = db["stars"]
 directors_col = db["directors"]
 languages_col = db["languages"]
+file_queue_col = db["file_queue"]
+ingest_jobs_col = db["ingest_jobs"]
+broadcasts_col = db["broadcasts"]
+posters_col = db["posters"]
 
 
 ''' JSON setup for Atlas Search'''
@@ -0,0 +1,131 @@
+import logging
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from pymongo import monitoring
+from metrics import Counter, Histogram
+from config import MONGO_SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Mongo Command Monitoring
+# =========================
+# A pymongo CommandListener on the shared client. Every command is timed per
+# command name and collection, grouped by the shape of its filter (the
+# query with every value replaced by "?"), and added to the stats of the API
+# request it ran for. Motor runs commands on executor threads with a copy of
+# the caller's context, so the request's stats dict is still reachable there.
+
+MAX_SHAPES = 500
+# Commands that carry no query worth grouping by
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "endSessions", "saslStart", "saslContinue", "buildInfo"}
+
+mongo_commands = Counter(
+    "mongo_commands_total", "Mongo commands by command, collection and result.", ("command", "collection", "result")
+)
+mongo_command_seconds = Histogram(
+    "mongo_command_duration_seconds", "Mongo command latency by command and collection.", ("command", "collection")
+)
+
+# Set per API request to {"ops": int, "seconds": float}
+request_db_stats = ContextVar("request_db_stats", default=None)
+
+def shape_of(value):
+    """Keeps the keys and operators of a query and replaces every value with "?"."""
+    if isinstance(value, dict):
+        return {key: shape_of(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [shape_of(item) for item in value]
+        return "?"
+    return "?"
+
+def _query_of(command_name, command):
+    if command_name in ("find", "count", "distinct"):
+        return command.get("filter", command.get("query"))
+    if command_name == "findAndModify":
+        return command.get("query")
+    if command_name == "aggregate":
+        return command.get("pipeline")
+    if command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes") or [{}]
+        return statements[0].get("q")
+    return None
+
+class CommandMonitor(monitoring.CommandListener):
+    def __init__(self, slow_ms):
+        self.slow_ms = slow_ms
+        self.pending = {}  # (connection, request_id) -> (collection, shape, request stats)
+        self.shapes = OrderedDict()  # (command, collection, shape) -> stats
+        self.lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ""
+        query = _query_of(event.command_name, event.command)
+        shape = repr(shape_of(query)) if query is not None else ""
+        self.pending[(event.connection_id, event.request_id)] = (collection, shape, request_db_stats.get())
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+    def _finish(self, event, result):
+        started = self.pending.pop((event.connection_id, event.request_id), None)
+        if started is None:
+            return
+        collection, shape, stats = started
+        seconds = event.duration_micros / 1_000_000
+        key = (event.command_name, collection, shape)
+        with self.lock:
+            mongo_commands.inc(command=event.command_name, collection=collection, result=result)
+            mongo_command_seconds.observe(seconds, command=event.command_name, collection=collection)
+            if stats is not None:
+                stats["ops"] += 1
+                stats["seconds"] += seconds
+            entry = self.shapes.get(key)
+            if entry is None:
+                if len(self.shapes) >= MAX_SHAPES:
+                    self.shapes.popitem(last=False)
+                entry = self.shapes[key] = {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            else:
+                self.shapes.move_to_end(key)
+            entry["count"] += 1
+            entry["total_seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+
+        if seconds * 1000 >= self.slow_ms:
+            route = f" during {stats['route']}" if stats and stats.get("route") else ""
+            logger.warning(
+                f"Slow Mongo {event.command_name} on {collection or '-'} took {seconds * 1000:.0f} ms{route}: {shape or '-'}"
+            )
+
+    def top_shapes(self, limit=20, sort="max"):
+        """Returns the query shapes with the highest max, total or average duration."""
+        sort_keys = {
+            "max": lambda item: item[1]["max_seconds"],
+            "total": lambda item: item[1]["total_seconds"],
+            "avg": lambda item: item[1]["total_seconds"] / item[1]["count"],
+        }
+        with self.lock:
+            items = sorted(self.shapes.items(), key=sort_keys[sort], reverse=True)[:limit]
+        return [
+            {
+                "command": command,
+                "collection": collection,
+                "shape": shape,
+                "count": stats["count"],
+                "avg_ms": round(stats["total_seconds"] / stats["count"] * 1000, 2),
+                "max_ms": round(stats["max_seconds"] * 1000, 2),
+                "total_ms": round(stats["total_seconds"] * 1000, 2),
+            }
+            for (command, collection, shape), stats in items
+        ]
+
+command_monitor = CommandMonitor(MONGO_SLOW_QUERY_MS)
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from db import genres_col, stars_col, directors_col, languages_col
+
+logger = logging.getLogger(__name__)
+
+class DimensionResolver:
+    """
+    Resolves dimension documents (genres, stars, directors, languages) to their _id.
+    Keeps a name -> _id map in memory and creates all missing names of a call
+    with a single bulk_write of upserts, backed by a unique index on `name`.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.ids = {}
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+    async def ensure_index(self):
+        try:
+            await self.collection.create_index("name", unique=True)
+        except OperationFailure as e:
+            logger.warning(f"Could not create unique index on {self.collection.name}.name, remove duplicate names first: {e}")
+
+    async def load(self):
+        """Loads the name -> _id map once per process."""
+        if self._loaded:
+            return
+        async with self._lock:
+            if self._loaded:
+                return
+            async for doc in self.collection.find({}, {"name": 1}):
+                self.ids.setdefault(doc["name"], doc["_id"])
+            self._loaded = True
+
+    async def resolve(self, docs):
+        """Returns the _id of every doc (a dict with at least `name`), in order."""
+        await self.load()
+        missing = {}
+        for doc in docs:
+            if doc["name"] not in self.ids:
+                missing.setdefault(doc["name"], doc)
+
+        if missing:
+            names = list(missing)
+            ops = [UpdateOne({"name": name}, {"$setOnInsert": missing[name]}, upsert=True) for name in names]
+            try:
+                result = await self.collection.bulk_write(ops, ordered=False)
+                upserted = result.upserted_ids.items()
+            except BulkWriteError as e:
+                # Lost an upsert race against another writer, the names exist now
+                upserted = [(u["index"], u["_id"]) for u in e.details.get("upserted", [])]
+            for index, _id in upserted:
+                self.ids[names[index]] = _id
+
+            # Names that already existed in the collection but not in memory
+            leftover = [name for name in names if name not in self.ids]
+            if leftover:
+                async for doc in self.collection.find({"name": {"$in": leftover}}, {"name": 1}):
+                    self.ids[doc["name"]] = doc["_id"]
+
+        return [self.ids[doc["name"]] for doc in docs if doc["name"] in self.ids]
+
+genre_resolver = DimensionResolver(genres_col)
+star_resolver = DimensionResolver(stars_col)
+director_resolver = DimensionResolver(directors_col)
+language_resolver = DimensionResolver(languages_col)
+
+RESOLVERS = (genre_resolver, star_resolver, director_resolver, language_resolver)
+
+async def init_dimensions():
+    """Creates the unique name indexes and loads the name -> _id maps."""
+    await asyncio.gather(*(resolver.ensure_index() for resolver in RESOLVERS))
+    await asyncio.gather(*(resolver.load() for resolver in RESOLVERS))
@@ -1,21 +1,27 @@
 import re
+import time
 import base64
 from cache import cache
 import logging
 from fastapi import FastAPI, Request, Depends, HTTPException, status, Header
-from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
+from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from config import MY_DOMAIN, CF_DOMAIN, MAX_FILES_PER_SESSION
 from utility import is_user_authorized, get_user_firstname, build_search_pipeline
-from db import tmdb_col, files_col, comments_col, auth_users_col, genres_col, stars_col, directors_col
+from db import tmdb_col, files_col, genres_col, stars_col, directors_col
 from tmdb import POSTER_BASE_URL
+from poster_cache import poster_cache, PosterNotFound, CACHE_CONTROL
+from file_delivery import dispatch_once, send_file, send_files, FileUnavailable, QuotaExceeded, TooManyInFlight
+from comments import add_comment, get_comments_page, get_comments_since, get_total_pages
+import metrics
+from db_monitor import request_db_stats
 from app import bot
-from config import TMDB_CHANNEL_ID, OWNER_ID, CF_DOMAINX
-from datetime import datetime, timezone
+from config import TMDB_CHANNEL_ID, OWNER_ID, CF_DOMAINX, METRICS_TOKEN
 from handlers.admin import router as admin_router
 from bson.objectid import ObjectId
 from pydantic import BaseModel
+from typing import Optional, List
 from fastapi.staticfiles import StaticFiles
 import json
 from fastapi.encoders import ENCODERS_BY_TYPE
@@ -35,9 +41,41 @@ api.add_middleware(
     allow_headers=["*"],
 )
 
+@api.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        # Label by the route template so ids in the path don't create new series
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", None) or "unmatched"
+        metrics.http_request_seconds.observe(time.perf_counter() - started, method=request.method, route=route_path)
+        metrics.http_requests.inc(method=request.method, route=route_path, status=status_code)
+
+@api.middleware("http")
+async def attach_db_stats(request: Request, call_next):
+    stats = {"ops": 0, "seconds": 0.0, "route": f"{request.method} {request.url.path}"}
+    token = request_db_stats.set(stats)
+    try:
+        response = await call_next(request)
+    finally:
+        request_db_stats.reset(token)
+    response.headers["X-DB-Ops"] = str(stats["ops"])
+    response.headers["Server-Timing"] = f"db;dur={stats['seconds'] * 1000:.1f}"
+    return response
+
 class SendFileRequest(BaseModel):
     file_id: str
 
+class SendFilesRequest(BaseModel):
+    file_ids: Optional[List[str]] = None
+    tmdb_id: Optional[int] = None
+    season: Optional[int] = None
+
 # Dependency to get user_id from Authorization header
 async def get_current_user(authorization: str = Header(None)):
     if not authorization:
@@ -58,54 +96,80 @@ async def get_current_user(authorization: str = Header(None)):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token format")
 
 @api.post("/api/send_file")
-async def send_file_to_user(request: SendFileRequest, user_id: int = Depends(get_current_user)):
-    user = await auth_users_col.find_one({"user_id": user_id})
-    file_count = user.get("file_count", 0) if user else 0
-
-    if file_count >= MAX_FILES_PER_SESSION:
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=f"You have reached your daily limit of {MAX_FILES_PER_SESSION} files."
-        )
+async def send_file_to_user(
+    request: SendFileRequest,
+    user_id: int = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
+    # Without a client key, the same file requested twice in a row is one send
+    key = f"{user_id}:{idempotency_key or request.file_id}"
     try:
-        file = await files_col.find_one({"_id": ObjectId(request.file_id)})
-        if not file:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
-
-        channel_id = file.get("channel_id")
-        message_id = file.get("message_id")
-        filename = file.get("file_name")
-        if not channel_id or not message_id:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="File metadata is incomplete")
-
-        await bot.copy_message(
-            chat_id=user_id,
-            from_chat_id=channel_id,
-            message_id=message_id,
-            caption=f"<b>{filename}</b>",
-            protect_content=True
-        )
-                    
-        await auth_users_col.update_one(
-                {"user_id": user_id},
-                {"$inc": {"file_count": 1}},
-                upsert=True
-            )
-
-        logging.info(f"{user_id}: {channel_id} | {message_id}")
+        await dispatch_once(key, user_id, lambda: send_file(bot, user_id, request.file_id))
         return JSONResponse(content={"message": "File sent successfully"})
 
-    except HTTPException:
-        raise
-
+    except FileUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except (QuotaExceeded, TooManyInFlight) as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
     except Exception as e:
         logging.error(f"Failed to send file to user {user_id}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to send file")
 
+@api.post("/api/send_files")
+async def send_files_to_user(
+    request: SendFilesRequest,
+    user_id: int = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """Sends a list of files, or every file of a TV season, in one request."""
+    if request.file_ids:
+        batch = ",".join(sorted(request.file_ids))
+    elif request.tmdb_id is not None and request.season is not None:
+        batch = f"{request.tmdb_id}:{request.season}"
+    else:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Give file_ids or tmdb_id and season")
+
+    key = f"{user_id}:batch:{idempotency_key or batch}"
+    try:
+        results = await dispatch_once(key, user_id, lambda: send_files(
+            bot, user_id, file_ids=request.file_ids, tmdb_id=request.tmdb_id, season=request.season
+        ))
+    except TooManyInFlight as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+    except Exception as e:
+        logging.error(f"Failed to send files to user {user_id}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to send files")
+
+    if not results:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No files found")
+    if not any(result["status"] == "sent" for result in results) and any(result["status"] == "quota_exceeded" for result in results):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"You have reached your daily limit of {MAX_FILES_PER_SESSION} files."
+        )
+    return {"results": results}
+
 @api.get("/")
 async def root():
     return JSONResponse({"message": "👋 Hola Amigo!"})
 
+@api.get("/metrics")
+async def get_metrics(authorization: str = Header(None)):
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@api.get("/api/poster/{variant}/{poster_path}")
+async def get_poster(variant: str, poster_path: str):
+    try:
+        path = await poster_cache.get(variant, poster_path)
+    except PosterNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Poster not found")
+    except Exception as e:
+        logging.error(f"Failed to fetch poster {variant}/{poster_path}: {e}")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Failed to fetch poster")
+    return FileResponse(path, headers={"Cache-Control": CACHE_CONTROL})
+
 @api.post("/api/authorize")
 async def api_authorize(request: Request):
     data = await request.json()
@@ -384,34 +448,31 @@ async def get_others(page: int = 1, search: str = None, sort: str = "recent", us
 async def create_comment(request: Request, user_id: int = Depends(get_current_user)):
     data = await request.json()
     comment_text = data.get("comment")
-    user_name = await get_user_firstname(user_id)
     if not comment_text:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Comment text cannot be empty.")
+    user_name = await get_user_firstname(user_id)
 
-    comment = {
-        "user_name": user_name,
-        "comment": comment_text,
-        "created_at": datetime.now(timezone.utc)
-    }
-    await comments_col.insert_one(comment)
-    return {"message": "Comment added successfully"}
+    comment = await add_comment(user_name, comment_text)
+    return {"message": "Comment added successfully", "comment": comment}
 
 @api.get("/api/comments")
-async def get_comments(page: int = 1, user_id: int = Depends(get_current_user)):
+async def get_comments(page: int = 1, since: Optional[str] = None, user_id: int = Depends(get_current_user)):
+    """
+    Returns a page of comments, newest first.
+    With `since` (the newest comment id the client has), returns only newer comments.
+    """
     page_size = 5
-    skip = (page - 1) * page_size
-
-    comments = []
-    async for comment in comments_col.find().sort("_id", -1).skip(skip).limit(page_size):
-        comment["_id"] = str(comment["_id"])
-        comment["first_name"] = comment["user_name"]
-        comments.append(comment)
-
-    total_comments = await comments_col.count_documents({})
+    if since:
+        try:
+            comments = await get_comments_since(since)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid comment id")
+    else:
+        comments = await get_comments_page(page, page_size)
 
     return {
         "comments": comments,
-        "total_pages": (total_comments + page_size - 1) // page_size,
+        "total_pages": await get_total_pages(page_size),
         "current_page": page
     }
 
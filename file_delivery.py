@@ -0,0 +1,312 @@
+import asyncio
+import logging
+from collections import defaultdict
+from bson.objectid import ObjectId
+from cachetools import TTLCache
+from pymongo import UpdateOne, ReturnDocument
+from db import auth_users_col, files_col
+from config import OWNER_ID, MAX_FILES_PER_SESSION
+from utility import safe_api_call, get_media_ids
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# File Delivery
+# =========================
+# A send reserves quota with one conditional update before any Telegram call
+# and gives it back if the send fails. Requests with the same idempotency key
+# share one send, and each user may only have a few sends running at once.
+# Files are sent by their stored file_id (one Telegram call); copy_message is
+# only the fallback for files ingested before file_ids were stored, or whose
+# file_id went stale.
+
+MAX_IN_FLIGHT_PER_USER = 2
+IDEMPOTENCY_TTL_SECONDS = 60
+MAX_BATCH_FILES = 100
+FORWARD_CHUNK_SIZE = 100  # Telegram's limit for one forward_messages call
+
+class QuotaExceeded(Exception):
+    pass
+
+class TooManyInFlight(Exception):
+    pass
+
+class FileUnavailable(Exception):
+    pass
+
+class SendFailed(Exception):
+    pass
+
+recent_sends = TTLCache(maxsize=10000, ttl=IDEMPOTENCY_TTL_SECONDS)  # key -> Task
+in_flight = defaultdict(int)
+
+async def reserve_files(user_id, count=1):
+    """Atomically takes `count` files from the user's quota. Returns False if that would exceed it."""
+    if user_id == OWNER_ID:
+        return True
+    doc = await auth_users_col.find_one_and_update(
+        {
+            "user_id": user_id,
+            "$or": [
+                {"file_count": {"$lte": MAX_FILES_PER_SESSION - count}},
+                {"file_count": {"$exists": False}},
+            ],
+        },
+        {"$inc": {"file_count": count}},
+        projection={"_id": 1},
+    )
+    return doc is not None
+
+async def reserve_up_to(user_id, wanted):
+    """Reserves as many of `wanted` files as the quota still allows. Returns how many were reserved."""
+    if user_id == OWNER_ID:
+        return wanted
+    if wanted <= 0:
+        return 0
+    # One pipeline update raises the count by what is left, capped at the quota
+    before = await auth_users_col.find_one_and_update(
+        {
+            "user_id": user_id,
+            "$or": [
+                {"file_count": {"$lt": MAX_FILES_PER_SESSION}},
+                {"file_count": {"$exists": False}},
+            ],
+        },
+        [{"$set": {"file_count": {"$min": [
+            {"$add": [{"$ifNull": ["$file_count", 0]}, wanted]},
+            MAX_FILES_PER_SESSION,
+        ]}}}],
+        projection={"file_count": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if before is None:
+        return 0
+    return min(wanted, MAX_FILES_PER_SESSION - before.get("file_count", 0))
+
+async def release_files(user_id, count=1):
+    """Gives back reserved files whose send failed."""
+    if user_id == OWNER_ID or count <= 0:
+        return
+    await auth_users_col.update_one(
+        {"user_id": user_id, "file_count": {"$gte": count}},
+        {"$inc": {"file_count": -count}},
+    )
+
+async def get_sendable_file(file_id):
+    if not ObjectId.is_valid(file_id):
+        raise FileUnavailable("File not found")
+    file = await files_col.find_one(
+        {"_id": ObjectId(file_id)}, {"channel_id": 1, "message_id": 1, "file_name": 1, "file_id": 1}
+    )
+    if not file:
+        raise FileUnavailable("File not found")
+    if not file.get("channel_id") or not file.get("message_id"):
+        raise FileUnavailable("File metadata is incomplete")
+    return file
+
+async def _remember_media_ids(file, message):
+    file_id, file_unique_id = get_media_ids(message)
+    if file_id and file_id != file.get("file_id"):
+        await files_col.update_one(
+            {"_id": file["_id"]},
+            {"$set": {"file_id": file_id, "file_unique_id": file_unique_id}}
+        )
+
+async def deliver_file(bot, user_id, file, caption):
+    """Sends a files_col document to a user. Returns the sent message, or None."""
+    sent = None
+    if file.get("file_id"):
+        sent = await safe_api_call(lambda: bot.send_cached_media(
+            chat_id=user_id,
+            file_id=file["file_id"],
+            caption=caption,
+            protect_content=True
+        ), chat_id=user_id)
+    if not sent:
+        sent = await safe_api_call(lambda: bot.copy_message(
+            chat_id=user_id,
+            from_chat_id=file["channel_id"],
+            message_id=file["message_id"],
+            caption=caption,
+            protect_content=True
+        ), chat_id=user_id)
+        if sent:
+            await _remember_media_ids(file, sent)
+    return sent
+
+async def send_file(bot, user_id, file_id):
+    file = await get_sendable_file(file_id)
+    if not await reserve_files(user_id):
+        raise QuotaExceeded(f"You have reached your daily limit of {MAX_FILES_PER_SESSION} files.")
+    try:
+        sent = await deliver_file(bot, user_id, file, f"<b>{file.get('file_name')}</b>")
+        if not sent:
+            raise SendFailed("Failed to send file")
+    except Exception:
+        await release_files(user_id)
+        raise
+    logger.info(f"{user_id}: {file['channel_id']} | {file['message_id']}")
+
+async def _forward_chunk(bot, user_id, channel_id, files):
+    """Forwards up to FORWARD_CHUNK_SIZE files of one channel in one call. Returns the ids of the sent files."""
+    messages = await safe_api_call(lambda: bot.forward_messages(
+        chat_id=user_id,
+        from_chat_id=channel_id,
+        message_ids=[file["message_id"] for file in files],
+        drop_author=True,
+        protect_content=True
+    ), chat_id=user_id)
+    if not messages:
+        return set()
+    if not isinstance(messages, list):
+        messages = [messages]
+    if len(messages) == len(files):
+        return {file["_id"] for file in files}
+    # Some messages were not forwarded, tell them apart by their media
+    await _fill_unique_ids(bot, channel_id, [file for file in files if not file.get("file_unique_id")])
+    sent_unique_ids = {get_media_ids(message)[1] for message in messages}
+    return {file["_id"] for file in files if file.get("file_unique_id") in sent_unique_ids}
+
+async def _fill_unique_ids(bot, channel_id, files):
+    """Reads the media ids of files ingested before they were stored, and stores them."""
+    if not files:
+        return
+    messages = await safe_api_call(
+        lambda: bot.get_messages(channel_id, [file["message_id"] for file in files])
+    ) or []
+    by_id = {message.id: message for message in messages if message and not message.empty}
+    operations = []
+    for file in files:
+        message = by_id.get(file["message_id"])
+        file_id, file_unique_id = get_media_ids(message) if message else (None, None)
+        if file_unique_id:
+            file["file_unique_id"] = file_unique_id
+            operations.append(UpdateOne(
+                {"_id": file["_id"]},
+                {"$set": {"file_id": file_id, "file_unique_id": file_unique_id}}
+            ))
+    if operations:
+        await files_col.bulk_write(operations, ordered=False)
+
+async def send_files(bot, user_id, file_ids=None, tmdb_id=None, season=None):
+    """
+    Sends several files, given by id or as a whole TV season, reserving quota
+    once for all of them. Returns a result per file, in request order.
+    """
+    projection = {"channel_id": 1, "message_id": 1, "file_name": 1, "file_unique_id": 1}
+    if file_ids:
+        file_ids = list(dict.fromkeys(file_ids))[:MAX_BATCH_FILES]
+        object_ids = [ObjectId(file_id) for file_id in file_ids if ObjectId.is_valid(file_id)]
+        found = {
+            str(file["_id"]): file
+            async for file in files_col.find({"_id": {"$in": object_ids}}, projection)
+        }
+        files = [found[file_id] for file_id in file_ids if file_id in found]
+        results = {file_id: "not_found" for file_id in file_ids}
+    else:
+        query = {
+            "tmdb_id": tmdb_id,
+            "tmdb_type": "tv",
+            "season_number": season,
+            "file_name": {"$not": {"$regex": r"\.srt$", "$options": "i"}}
+        }
+        files = await files_col.find(query, projection).sort("file_name", 1).to_list(length=MAX_BATCH_FILES)
+        results = {}
+    files = [file for file in files if file.get("channel_id") and file.get("message_id")]
+    for file in files:
+        results[str(file["_id"])] = "quota_exceeded"
+
+    reserved = await reserve_up_to(user_id, len(files))
+    to_send = files[:reserved]
+    sent = set()
+    try:
+        channels = {}
+        for file in to_send:
+            channels.setdefault(file["channel_id"], []).append(file)
+        for channel_id, channel_files in channels.items():
+            for start in range(0, len(channel_files), FORWARD_CHUNK_SIZE):
+                chunk = channel_files[start:start + FORWARD_CHUNK_SIZE]
+                sent |= await _forward_chunk(bot, user_id, channel_id, chunk)
+    finally:
+        for file in to_send:
+            results[str(file["_id"])] = "sent" if file["_id"] in sent else "failed"
+        await release_files(user_id, len(to_send) - len(sent))
+
+    logger.info(f"{user_id}: sent {len(sent)}/{len(results)} files in a batch")
+    return [{"file_id": file_id, "status": result} for file_id, result in results.items()]
+
+async def dispatch_once(key, user_id, coro_factory):
+    """
+    Runs `coro_factory()` once per idempotency key: repeated calls while it runs,
+    or shortly after it succeeded, get the same result instead of a second send.
+    """
+    task = recent_sends.get(key)
+    if task is not None:
+        return await asyncio.shield(task)
+    if in_flight[user_id] >= MAX_IN_FLIGHT_PER_USER:
+        raise TooManyInFlight("Please wait for your previous files to arrive.")
+
+    in_flight[user_id] += 1
+
+    async def run():
+        try:
+            return await coro_factory()
+        finally:
+            in_flight[user_id] -= 1
+            if not in_flight[user_id]:
+                del in_flight[user_id]
+
+    task = recent_sends[key] = asyncio.ensure_future(run())
+
+    def forget_failure(done):
+        # Only successful sends are remembered, a failed one may be retried
+        if done.cancelled() or done.exception() is not None:
+            if recent_sends.get(key) is done:
+                del recent_sends[key]
+
+    task.add_done_callback(forget_failure)
+    return await asyncio.shield(task)
+
+async def backfill_file_ids(bot, batch_size=200):
+    """Stores file_id/file_unique_id on files ingested before they were recorded. Returns the number updated.
+
+    Files whose message is gone (or has no media) get file_id None, so later runs skip them.
+    """
+    updated = 0
+    batch = []
+
+    async def flush(channel_id, docs):
+        messages = await safe_api_call(
+            lambda: bot.get_messages(channel_id, [doc["message_id"] for doc in docs])
+        )
+        if messages is None:
+            # The call failed; leave the batch for the next run
+            return 0
+        by_id = {msg.id: msg for msg in messages if msg and not msg.empty}
+        operations = []
+        found = 0
+        for doc in docs:
+            msg = by_id.get(doc["message_id"])
+            file_id, file_unique_id = get_media_ids(msg) if msg else (None, None)
+            if file_id:
+                found += 1
+                update = {"$set": {"file_id": file_id, "file_unique_id": file_unique_id}}
+            else:
+                update = {"$set": {"file_id": None}}
+            operations.append(UpdateOne({"_id": doc["_id"]}, update))
+        if operations:
+            await files_col.bulk_write(operations, ordered=False)
+        return found
+
+    # No index covers this one-off scan, so let the server spill the sort to disk
+    cursor = files_col.find(
+        {"file_id": {"$exists": False}}, {"channel_id": 1, "message_id": 1}, allow_disk_use=True
+    ).sort([("channel_id", 1), ("message_id", 1)])
+    async for doc in cursor:
+        if batch and (len(batch) >= batch_size or batch[0]["channel_id"] != doc["channel_id"]):
+            updated += await flush(batch[0]["channel_id"], batch)
+            batch = []
+        batch.append(doc)
+    if batch:
+        updated += await flush(batch[0]["channel_id"], batch)
+    return updated
@@ -0,0 +1,107 @@
+import re
+import logging
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+PARSE_CACHE_SIZE = 8192
+
+# =========================
+# Precompiled Patterns
+# =========================
+
+# Uploader tags, tried in order; only the first matching pattern is applied
+USERNAME_PATTERNS = [
+    re.compile(r"^@[\w\.-]+?(?=_)"),
+    re.compile(r"_@[A-Za-z]+_|@[A-Za-z]+_|[\[\]\s@]*@[^.\s\[\]]+[\]\[\s@]*"),
+    re.compile(r"^[\w\.-]+?(?=_Uploads_)"),
+    re.compile(r"^(?:by|from)[\s_-]+[\w\.-]+?(?=_)"),
+    re.compile(r"^\[[\w\.-]+?\][\s_-]*"),
+    re.compile(r"^\([\w\.-]+?\)[\s_-]*"),
+]
+EDGE_SEPARATORS = re.compile(r"^[_\s-]+|[_\s-]+$")
+EXTENSION_TAIL = re.compile(r'\.(mkv|mp4|webm).*$', re.IGNORECASE)
+UP_TO_EXTENSION = re.compile(r'^(.*?\.(mkv|mp4|webm))', re.IGNORECASE)
+UNSAFE_CHARS = re.compile(r"[',]")
+AKA_PATTERN = re.compile(r'\sA[.\s]?K[.\s]?A[.]?\s+', re.IGNORECASE)
+
+class ParsedTitle(NamedTuple):
+    title: str
+    year: Optional[int]
+    season: Optional[int]
+    episode: Optional[int]
+
+# =========================
+# Cleaning
+# =========================
+
+def remove_redandent(filename):
+    """
+    Remove common username patterns from a filename while preserving the content title.
+
+    Args:
+        filename (str): The input filename
+
+    Returns:
+        str: Filename with usernames removed
+    """
+    result = filename.replace("\n", "\\n")
+    for pattern in USERNAME_PATTERNS:
+        result, count = pattern.subn(" ", result)
+        if count:
+            break
+    return EDGE_SEPARATORS.sub(" ", result)
+
+def remove_extension(caption):
+    try:
+        # Remove the extension and everything after it
+        return EXTENSION_TAIL.sub('', caption)
+    except Exception as e:
+        logger.error(e)
+        return None
+
+def remove_unwanted(caption):
+    try:
+        # Match and keep everything up to and including the extension
+        match = UP_TO_EXTENSION.match(caption)
+        if match:
+            return match.group(1)
+        return caption  # Return original if no match
+    except Exception as e:
+        logger.error(e)
+        return None
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def clean_file_name(raw_name):
+    """Normalizes a caption or file name into the stored `file_name`."""
+    return remove_extension(UNSAFE_CHARS.sub("", raw_name.replace("&", "and")).split("\n")[0])
+
+# =========================
+# Title Parsing
+# =========================
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_title(file_name):
+    """Extracts the search title, year, season and episode from a stored file name."""
+    import PTN  # loaded on first parse, keeps it off the startup path
+    parsed_data = PTN.parse(remove_redandent(file_name))
+    title = parsed_data.get("title", "").replace("_", " ").replace("-", " ").replace(":", " ")
+    title = ' '.join(title.split())
+    title = AKA_PATTERN.split(title, maxsplit=1)[0].strip()
+    return ParsedTitle(
+        title=title,
+        year=parsed_data.get("year"),
+        season=parsed_data.get("season"),
+        episode=parsed_data.get("episode"),
+    )
+
+def parse_titles(file_names):
+    """Batch version of parse_title for backfills; repeated names are parsed once."""
+    return [parse_title(name) for name in file_names]
+
+def parse_cache_info():
+    return {
+        "clean_file_name": clean_file_name.cache_info()._asdict(),
+        "parse_title": parse_title.cache_info()._asdict(),
+    }
@@ -1,9 +1,8 @@
 import re
-import asyncio
 import logging
 from fastapi import APIRouter, Depends, HTTPException, Header, status
-from db import tmdb_col, files_col, genres_col, stars_col, directors_col, allowed_channels_col
-from utility import is_user_authorized, build_search_pipeline, safe_api_call, upload_to_imgbb
+from db import tmdb_col, files_col, genres_col, stars_col, directors_col, allowed_channels_col, posters_col
+from utility import is_user_authorized, build_search_pipeline, safe_api_call
 from config import OWNER_ID, SEND_UPDATES, UPDATE_CHANNEL_ID
 from app import bot
 from cache import invalidate_cache
@@ -11,6 +10,11 @@ from bson.objectid import ObjectId
 from pyrogram import enums
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from tmdb import get_info, upsert_tmdb_info, format_tmdb_info_from_db
+from rate_limiter import PRIORITY_INTERACTIVE
+from ingest_jobs import list_jobs
+from db_monitor import command_monitor
+from posters import upload_poster, upload_posters
+from pymongo import UpdateOne
 from typing import Optional
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
@@ -95,6 +99,16 @@ async def get_tv_season_episodes(tmdb_id: int, season_number: int, admin_id: int
 
     raise HTTPException(status_code=404, detail="Season not found")
 
+@router.get("/jobs")
+async def get_ingest_jobs(admin_id: int = Depends(get_current_admin), history: int = 20):
+    return await list_jobs(history=min(max(history, 0), 100))
+
+@router.get("/db/slow")
+async def get_slow_queries(admin_id: int = Depends(get_current_admin), limit: int = 20, sort: str = "max"):
+    if sort not in ("max", "total", "avg"):
+        raise HTTPException(status_code=400, detail="sort must be one of max, total, avg")
+    return {"shapes": command_monitor.top_shapes(max(1, min(limit, 100)), sort)}
+
 @router.get("/channels")
 async def get_channels(admin_id: int = Depends(get_current_admin)):
     channels = []
@@ -135,6 +149,13 @@ async def get_files(
         total_files = await files_col.count_documents(query)
         files_data = await files_cursor.to_list(length=page_size)
 
+    # Delete links live with the shared upload in posters_col, not on the file
+    poster_urls = list({file["poster_url"] for file in files_data if file.get("poster_url")})
+    delete_urls = {}
+    if poster_urls:
+        async for poster in posters_col.find({"url": {"$in": poster_urls}}, {"_id": 0, "url": 1, "delete_url": 1}):
+            delete_urls[poster["url"]] = poster.get("delete_url")
+
     files = []
     for file in files_data:
         files.append({
@@ -142,7 +163,7 @@ async def get_files(
             "file_name": file.get("file_name"),
             "tmdb_id": file.get("tmdb_id"),
             "poster_url": file.get("poster_url"),
-            "poster_delete_url": file.get("poster_delete_url"), 
+            "poster_delete_url": delete_urls.get(file.get("poster_url")) or file.get("poster_delete_url"),
         })
         
     total_pages = (total_files + page_size - 1) // page_size
@@ -180,7 +201,8 @@ async def send_to_channel(data: dict, admin_id: int = Depends(get_current_admin)
                 caption=caption,
                 parse_mode=enums.ParseMode.HTML,
                 reply_markup=keyboard
-            )
+            ),
+            chat_id=UPDATE_CHANNEL_ID,
         )
         return {"status": "success"}
     else:
@@ -217,9 +239,9 @@ async def send_all_to_channel(data: dict = None, admin_id: int = Depends(get_cur
                     caption=caption,
                     parse_mode=enums.ParseMode.HTML,
                     reply_markup=keyboard
-                )
+                ),
+                chat_id=UPDATE_CHANNEL_ID,
             )
-            await asyncio.sleep(3)
     return {"status": "success"}
 
 @router.post("/tmdb")
@@ -233,7 +255,7 @@ async def add_tmdb_entry(data: dict, admin_id: int = Depends(get_current_admin))
     except (ValueError, TypeError):
         raise HTTPException(status_code=400, detail="Invalid TMDB ID")
 
-    info = await get_info(tmdb_type, tmdb_id)
+    info = await get_info(tmdb_type, tmdb_id, priority=PRIORITY_INTERACTIVE)
     if "message" in info and info["message"].startswith("Error"):
         raise HTTPException(status_code=404, detail=info["message"])
     
@@ -299,24 +321,51 @@ async def update_tmdb_entry(tmdb_id: str, tmdb_type: str, data: dict, admin_id:
     invalidate_cache()
     return {"status": "success"}
 
+def poster_update(imgbb_data):
+    # The delete link of the new poster is looked up in posters_col when files
+    # are listed; a link stored by older uploads belongs to the old image
+    return {"$set": {"poster_url": imgbb_data["url"]}, "$unset": {"poster_delete_url": ""}}
+
 @router.put("/files/{file_id}")
 async def update_file_poster(file_id: str, data: dict, admin_id: int = Depends(get_current_admin)):
     poster_url = data.get("poster_url")
     try:
-        imgbb_data = await upload_to_imgbb(poster_url)
-        if imgbb_data is None:
-            raise ValueError("Image upload failed, received no data.")
-        url = imgbb_data.get("url")
-        delete_url = imgbb_data.get("delete_url")
-        db_update = {"poster_url": url}
-        if delete_url:
-            db_update["poster_delete_url"] = delete_url
-        await files_col.update_one({"_id": ObjectId(file_id)}, {"$set": db_update})
+        imgbb_data = await upload_poster(poster_url)
+        await files_col.update_one({"_id": ObjectId(file_id)}, poster_update(imgbb_data))
         invalidate_cache()
-        return {"status": "success", "poster_url": url}
+        return {"status": "success", "poster_url": imgbb_data["url"]}
     except ValueError as e:
         logger.error(f"Failed to upload poster for file {file_id}: {e}")
         raise HTTPException(status_code=400, detail="Failed to upload image. Please try again.")
+
+@router.put("/files/posters/batch")
+async def update_file_posters(data: dict, admin_id: int = Depends(get_current_admin)):
+    """
+    Uploads posters for many files at once.
+    Body: {"items": [{"file_id": "...", "poster_url": "..."}, ...]}
+    """
+    items = [item for item in data.get("items", []) if item.get("file_id") and item.get("poster_url")]
+    if not items:
+        raise HTTPException(status_code=400, detail="No files given.")
+
+    uploads = await upload_posters(item["poster_url"] for item in items)
+    operations = []
+    results = []
+    for item in items:
+        uploaded = uploads[item["poster_url"]]
+        if not ObjectId.is_valid(item["file_id"]):
+            results.append({"file_id": item["file_id"], "status": "error", "detail": "Invalid file id"})
+            continue
+        if isinstance(uploaded, Exception):
+            results.append({"file_id": item["file_id"], "status": "error", "detail": str(uploaded)})
+            continue
+        operations.append(UpdateOne({"_id": ObjectId(item["file_id"])}, poster_update(uploaded)))
+        results.append({"file_id": item["file_id"], "status": "success", "poster_url": uploaded["url"]})
+
+    if operations:
+        await files_col.bulk_write(operations, ordered=False)
+        invalidate_cache()
+    return {"results": results}
     
 @router.delete("/files/{file_id}")
 async def delete_file(file_id: str, admin_id: int = Depends(get_current_admin)):
@@ -3,7 +3,7 @@ import os
 import sys
 import logging
 from bson import ObjectId
-from pyrogram.errors import UserIsBlocked, InputUserDeactivated, ListenerTimeout, PeerIdInvalid, UserIsBot
+from pyrogram.errors import ListenerTimeout
 
 from pyrogram import filters, enums
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
@@ -13,21 +13,32 @@ from db import files_col, allowed_channels_col, auth_users_col, users_col, tmdb_
 import asyncio
 from utility import (
     extract_channel_and_msg_id,
-    get_allowed_channels,
-    queue_file_for_processing,
-    get_queue_size,
+    is_allowed_channel,
+    add_allowed_channel,
+    remove_allowed_channel,
     auto_delete_message,
     safe_api_call,
-    remove_unwanted,
     human_readable_size,
     extract_tmdb_link,
-    extract_file_info
+    extract_file_info,
+    iter_message_batches,
+)
+from filename_parser import remove_unwanted
+from ingest_queue import (
+    queue_file_for_processing,
+    get_queue_depth,
+    CLASS_ADMIN,
+    CLASS_BULK,
 )
+from ingest_jobs import start_job, finish_enqueue, record as record_job_outcome, list_jobs
+from broadcast import start_broadcast, cancel_broadcast, is_broadcasting
+from file_delivery import backfill_file_ids
 from app import bot
 
 logger = logging.getLogger(__name__)
 
-broadcasting = False
+# /index ranges up to this many messages are treated as admin fix-ups, not backfills
+ADMIN_INDEX_RANGE = 50
 
 @bot.on_message(filters.private & (filters.document | filters.video))
 async def del_file_handler(client, message):
@@ -64,17 +75,16 @@ async def del_file_handler(client, message):
         logger.error(f"Error in del_file_handler: {e}")
         await message.reply_text(f"An error occurred: {e}")
 
-async def watch_queue(reply, total_files):
+async def watch_job(reply, job):
     last_message = ""
-    while get_queue_size() > 0:
-        processed_files = total_files - get_queue_size()
-        current_message = f"🔁 <b>Processing files...</b> {processed_files}/{total_files} processed."
+    while not job.finished:
+        current_message = f"🔁 <b>Processing files...</b>\n{job.summary()}"
         if last_message != current_message:
             await safe_api_call(lambda: reply.edit_text(current_message))
             last_message = current_message
         await asyncio.sleep(10)
 
-    final_message = f"✅ <b>Process completed!</b> {total_files} files processed."
+    final_message = f"✅ <b>Process completed!</b>\n{job.summary()}"
     if last_message != final_message:
         await safe_api_call(lambda: reply.edit_text(final_message))
 
@@ -109,41 +119,39 @@ async def copy_file_handler(client, message):
         reply = await message.reply_text(f"🔁 <b>Copying files from <code>{start_id}</code> to <code>{end_id}</code>...</b>\n"
                                        f"Total: {total}")
 
-        batch_size = 50
+        job = await start_job("copy", channel_id, start_id, end_id)
         count = 0
-        for batch_start in range(start_id, end_id + 1, batch_size):
-            batch_end = min(batch_start + batch_size - 1, end_id)
-            ids = list(range(batch_start, batch_end + 1))
-            messages = []
-            try:
-                messages = await safe_api_call(lambda: client.get_messages(channel_id, ids))
-            except Exception as e:
-                logger.warning(f"Could not get messages in batch {batch_start}-{batch_end}: {e}")
-
-            for msg in messages:
-                if not msg:
-                    continue
-                if msg.document or msg.video:
-                    caption = msg.caption or getattr(media, "file_name")
-                    caption = remove_unwanted(caption)
-
-                    copied_msg = await safe_api_call(lambda: client.copy_message(
-                        chat_id=dest_channel_id,
-                        from_chat_id=source_channel_id,
-                        message_id=msg.id,
-                        caption=f"<b>{caption}</b>"
-                    ))
-                    count += 1
-                    if copied_msg:
-                        await queue_file_for_processing(
-                            copied_msg,
-                            channel_id=dest_channel_id,
-                            reply_func=message.reply_text,
-                        )
-                await asyncio.sleep(3)
-            await safe_api_call(lambda: reply.edit_text(f"🔁 <b>Copying in progress...</b> {count}/{total} files copied so far."))
-
-        asyncio.create_task(watch_queue(reply, count))
+        try:
+            async for messages in iter_message_batches(client, channel_id, start_id, end_id):
+                for msg in messages:
+                    media = msg.document or msg.video
+                    if media:
+                        caption = msg.caption or getattr(media, "file_name")
+                        caption = remove_unwanted(caption)
+
+                        copied_msg = await safe_api_call(lambda: client.copy_message(
+                            chat_id=dest_channel_id,
+                            from_chat_id=source_channel_id,
+                            message_id=msg.id,
+                            caption=f"<b>{caption}</b>"
+                        ), chat_id=dest_channel_id)
+                        count += 1
+                        if copied_msg:
+                            await queue_file_for_processing(
+                                copied_msg,
+                                channel_id=dest_channel_id,
+                                reply_func=message.reply_text,
+                                priority_class=CLASS_BULK,
+                                job_id=job.job_id,
+                            )
+                        else:
+                            record_job_outcome(job.job_id, "queued")
+                            record_job_outcome(job.job_id, "failed")
+                await safe_api_call(lambda: reply.edit_text(f"🔁 <b>Copying in progress...</b> {count}/{total} files copied so far."))
+        finally:
+            # Even a failed scan must let the job finish once its queued files are done
+            finish_enqueue(job)
+        asyncio.create_task(watch_job(reply, job))
     except Exception as e:
         logger.error(f"[index_channel_files] Error: {e}")
         await message.reply_text("❌ <b>An error occurred during the indexing process.</b>")
@@ -171,44 +179,38 @@ async def index_channel_files(client, message):
             return
 
         channel_id = start_channel_id
-        allowed_channels = await get_allowed_channels()
-        if channel_id not in allowed_channels:
+        if not is_allowed_channel(channel_id):
             await message.reply_text("❌ <b>This channel is not allowed for indexing.</b>")
             return
 
         start_id = min(start_msg_id, end_msg_id)
         end_id = max(start_msg_id, end_msg_id)
+        priority_class = CLASS_ADMIN if end_id - start_id + 1 <= ADMIN_INDEX_RANGE else CLASS_BULK
 
         reply = await message.reply_text(
             f"🔁 <b>Indexing files from <code>{start_id}</code> to <code>{end_id}</code>...</b>\n"
             f"Logging duplicates: {log_duplicates}"
         )
 
-        batch_size = 50
+        job = await start_job("index", channel_id, start_id, end_id)
         count = 0
-        for batch_start in range(start_id, end_id + 1, batch_size):
-            batch_end = min(batch_start + batch_size - 1, end_id)
-            ids = list(range(batch_start, batch_end + 1))
-            messages = []
-            try:
-                messages = await safe_api_call(lambda: client.get_messages(channel_id, ids))
-            except Exception as e:
-                logger.warning(f"Could not get messages in batch {batch_start}-{batch_end}: {e}")
-
-            for msg in messages:
-                if not msg:
-                    continue
-                if msg.document or msg.video or msg.audio or msg.photo:
-                    await queue_file_for_processing(
-                        msg,
-                        channel_id=channel_id,
-                        reply_func=reply.edit_text,
-                        log_duplicates=log_duplicates,
-                    )
-                    count += 1
-            await safe_api_call(lambda: reply.edit_text(f"🔁 <b>Indexing in progress...</b> {count} files queued so far."))
-
-        asyncio.create_task(watch_queue(reply, count))
+        try:
+            async for messages in iter_message_batches(client, channel_id, start_id, end_id):
+                for msg in messages:
+                    if msg.document or msg.video or msg.audio or msg.photo:
+                        await queue_file_for_processing(
+                            msg,
+                            channel_id=channel_id,
+                            reply_func=reply.edit_text,
+                            log_duplicates=log_duplicates,
+                            priority_class=priority_class,
+                            job_id=job.job_id,
+                        )
+                        count += 1
+                await safe_api_call(lambda: reply.edit_text(f"🔁 <b>Indexing in progress...</b> {count} files queued so far."))
+        finally:
+            finish_enqueue(job)
+        asyncio.create_task(watch_job(reply, job))
     except Exception as e:
         logger.error(f"[index_channel_files] Error: {e}")
         await message.reply_text("❌ <b>An error occurred during the indexing process.</b>")
@@ -235,8 +237,7 @@ async def update_channel_files(client, message):
             return
 
         channel_id = start_channel_id
-        allowed_channels = await get_allowed_channels()
-        if channel_id not in allowed_channels:
+        if not is_allowed_channel(channel_id):
             await message.reply_text("❌ <b>This channel is not allowed for updating.</b>")
             return
 
@@ -245,31 +246,25 @@ async def update_channel_files(client, message):
 
         reply = await message.reply_text(f"🔁 <b>Updating files from <code>{start_id}</code> to <code>{end_id}</code>...</b>")
 
-        batch_size = 50
+        job = await start_job("update", channel_id, start_id, end_id)
         count = 0
-        for batch_start in range(start_id, end_id + 1, batch_size):
-            batch_end = min(batch_start + batch_size - 1, end_id)
-            ids = list(range(batch_start, batch_end + 1))
-            messages = []
-            try:
-                messages = await safe_api_call(lambda: client.get_messages(channel_id, ids))
-            except Exception as e:
-                logger.warning(f"Could not get messages in batch {batch_start}-{batch_end}: {e}")
-
-            for msg in messages:
-                if not msg:
-                    continue
-                if msg.document or msg.video or msg.audio or msg.photo:
-                    file_info = extract_file_info(msg, channel_id=channel_id)
-                    if file_info["file_name"]:
-                        await files_col.update_one(
-                            {"file_name": file_info["file_name"]},
-                            {"$set": {"message_id": msg.id, "channel_id": channel_id}},
-                        )
-                        count += 1
-            await safe_api_call(lambda: reply.edit_text(f"🔁 <b>Updating in progress...</b> {count} files updated so far."))
-
-        await safe_api_call(lambda: reply.edit_text(f"✅ <b>Update completed!</b> {count} files updated."))
+        try:
+            async for messages in iter_message_batches(client, channel_id, start_id, end_id):
+                for msg in messages:
+                    if msg.document or msg.video or msg.audio or msg.photo:
+                        file_info = extract_file_info(msg, channel_id=channel_id)
+                        if file_info["file_name"]:
+                            record_job_outcome(job.job_id, "queued")
+                            result = await files_col.update_one(
+                                {"file_name": file_info["file_name"]},
+                                {"$set": {"message_id": msg.id, "channel_id": channel_id}},
+                            )
+                            record_job_outcome(job.job_id, "done" if result.matched_count else "failed")
+                            count += 1
+                await safe_api_call(lambda: reply.edit_text(f"🔁 <b>Updating in progress...</b> {count} files updated so far."))
+        finally:
+            finish_enqueue(job)
+        await safe_api_call(lambda: reply.edit_text(f"✅ <b>Update completed!</b>\n{job.summary()}"))
     except Exception as e:
         logger.error(f"[update_channel_files] Error: {e}")
         await message.reply_text("❌ <b>An error occurred during the updating process.</b>")
@@ -347,11 +342,7 @@ async def add_channel_handler(client, message: Message):
     try:
         channel_id = int(message.command[1])
         channel_name = " ".join(message.command[2:])
-        await allowed_channels_col.update_one(
-            {"channel_id": channel_id},
-            {"$set": {"channel_id": channel_id, "channel_name": channel_name}},
-            upsert=True
-        )
+        await add_allowed_channel(channel_id, channel_name)
         await message.reply_text(f"✅ Channel {channel_id} ({channel_name}) added to allowed channels.")
     except ValueError:
         await message.reply_text("Invalid channel ID.")
@@ -366,8 +357,7 @@ async def remove_channel_handler(client, message: Message):
         return
     try:
         channel_id = int(message.command[1])
-        result = await allowed_channels_col.delete_one({"channel_id": channel_id})
-        if result.deleted_count:
+        if await remove_allowed_channel(channel_id):
             await message.reply_text(f"✅ Channel {channel_id} removed from allowed channels.")
         else:
             await message.reply_text("❌ Channel not found in allowed channels.")
@@ -379,78 +369,16 @@ async def remove_channel_handler(client, message: Message):
 
 @bot.on_message(filters.command("broadcast") & filters.chat(LOG_CHANNEL_ID))
 async def broadcast_handler(client, message: Message):
-    global broadcasting
     if message.reply_to_message:
-        if broadcasting:
+        if is_broadcasting():
             await message.reply_text("already broadcasting")
             return
-        users = await users_col.find({}, {"_id": 0, "user_id": 1}).to_list(length=None)
-        total_users = len(users)
-        sent_count = 0
-        failed_count = 0
-        removed_count = 0
-        broadcasting = True
-
-        status_message = await safe_api_call(lambda: message.reply_text(
-            f"📢 Broadcast in progress...\n\n"
-            f"👥 Total Users: {total_users}\n"
-            f"✅ Sent: {sent_count}\n"
-            f"❌ Failed: {failed_count}\n"
-            f"🗑️ Removed: {removed_count}",
-            reply_markup=InlineKeyboardMarkup(
-                [[InlineKeyboardButton("Cancel", callback_data="cancel_broadcast")]]
-            )
-        ))
-
-        for i, user in enumerate(users):
-            if not broadcasting:
-                await status_message.edit_text("📢 **Broadcast cancelled.**")
-                break
-            try:
-                msg = message.reply_to_message
-                if msg.forward_from_chat:
-                    await safe_api_call(lambda: msg.copy(chat_id=user["user_id"],
-                                                 caption=f"{msg.caption.html}\n\n✅ <b>Now Available!</b>",
-                                                 reply_markup=msg.reply_markup
-                                                 ))
-                else:
-                    await safe_api_call(lambda: msg.copy(user["user_id"]))
-                sent_count += 1
-            except (UserIsBlocked, InputUserDeactivated, PeerIdInvalid, UserIsBot):
-                await users_col.delete_one({"user_id": user["user_id"]})
-                removed_count += 1
-            except Exception as e:
-                failed_count += 1
-                logger.error(f"Error broadcasting to {user['user_id']}: {e}")
-
-            if i % 10 == 0:
-                await safe_api_call(lambda: status_message.edit_text(
-                    f"📢 Broadcast in progress...\n\n"
-                    f"👥 Total Users: {total_users}\n"
-                    f"✅ Sent: {sent_count}\n"
-                    f"❌ Failed: {failed_count}\n"
-                    f"🗑️ Removed: {removed_count}",
-                    reply_markup=InlineKeyboardMarkup(
-                        [[InlineKeyboardButton("Cancel", callback_data="cancel_broadcast")]]
-                    )
-                ))
-        else:
-            await status_message.edit_text(
-                f"✅ Broadcast finished!**\n\n"
-                f"👥 Total Users: {total_users}\n"
-                f"✅ Sent: {sent_count}\n"
-                f"❌ Failed: {failed_count}\n"
-                f"🗑️ Removed: {removed_count}"
-            )
-
-        broadcasting = False
+        await start_broadcast(client, message, message.reply_to_message)
 
 
 @bot.on_callback_query(filters.regex("cancel_broadcast"))
 async def cancel_broadcast_handler(client, query):
-    global broadcasting
-    if broadcasting:
-        broadcasting = False
+    if cancel_broadcast():
         await query.answer("Cancelling broadcast...", show_alert=True)
     else:
         await query.answer("No broadcast in progress.", show_alert=True)
@@ -467,6 +395,16 @@ async def send_log_file(client, message: Message):
     except Exception as e:
         logger.error(f"Failed to send log file: {e}")
 
+@bot.on_message(filters.command("backfill_ids") & filters.private & filters.user(OWNER_ID))
+async def backfill_file_ids_handler(client, message: Message):
+    reply = await message.reply_text("⏳ Storing file ids for older files...")
+    try:
+        updated = await backfill_file_ids(client)
+        await safe_api_call(lambda: reply.edit_text(f"✅ Stored file ids for {updated} files."))
+    except Exception as e:
+        logger.error(f"Error in backfill_file_ids_handler: {e}")
+        await safe_api_call(lambda: reply.edit_text(f"❌ Backfill stopped: {e}"))
+
 @bot.on_message(filters.command("stats") & filters.private & filters.user(OWNER_ID))
 async def stats_command(client, message: Message):
     try:
@@ -490,10 +428,13 @@ async def stats_command(client, message: Message):
         channel_docs = await allowed_channels_col.find({}, {"_id": 0, "channel_id": 1, "channel_name": 1}).to_list(length=None)
         channel_names = {c["channel_id"]: c.get("channel_name", "") for c in channel_docs}
 
+        queue_text = ", ".join(f"{name}: {count}" for name, count in get_queue_depth().items())
+
         text = (
             f"<b>Total auth users:</b> {total_auth_users} / {total_users}\n"
             f"<b>Files size:</b> {human_readable_size(total_storage)}\n"
             f"<b>Database storage used:</b> {db_storage / (1024 * 1024):.2f} MB\n"
+            f"<b>Queue:</b> {queue_text}\n"
         )
 
         if not channel_counts:
@@ -509,6 +450,31 @@ async def stats_command(client, message: Message):
     except Exception as e:
         logger.error(f"Error in stats_command: {e}")
         
+@bot.on_message(filters.command("jobs") & filters.private & filters.user(OWNER_ID))
+async def jobs_command(client, message: Message):
+    try:
+        jobs = await list_jobs(history=5)
+        text = "<b>Running jobs</b>\n"
+        if not jobs["running"]:
+            text += "None\n"
+        for doc in jobs["running"]:
+            eta = doc["eta_seconds"]
+            text += (
+                f"<code>{doc['_id']}</code> {doc['kind']}: "
+                f"{doc['done'] + doc['duplicate'] + doc['failed']}/{doc['queued']} "
+                f"({doc['files_per_second']} files/s, ETA {f'{eta:.0f}s' if eta is not None else 'unknown'})\n"
+            )
+        text += "\n<b>Recent jobs</b>\n"
+        for doc in jobs["finished"]:
+            text += (
+                f"<code>{doc['_id']}</code> {doc['kind']}: {doc['done']} saved, {doc['duplicate']} dup, "
+                f"{doc['failed']} failed, {doc['tmdb_matched']} tmdb ({doc['files_per_second']} files/s)\n"
+            )
+        reply = await message.reply_text(text, parse_mode=enums.ParseMode.HTML)
+        bot.loop.create_task(auto_delete_message(message, reply))
+    except Exception as e:
+        logger.error(f"Error in jobs_command: {e}")
+
 @bot.on_message(filters.command("op") & filters.chat(LOG_CHANNEL_ID))
 async def chatop_handler(client, message: Message):
     args = message.text.split(maxsplit=4)
@@ -1,12 +1,12 @@
 
 import logging
 import asyncio
-from datetime import datetime, timezone
+from datetime import datetime
 from pyrogram import filters, enums
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.errors import ChatAdminRequired, UserAlreadyParticipant
 
-from config import LOG_CHANNEL_ID, BOT_USERNAME, BACKUP_CHANNEL_LINK, CF_DOMAIN, TMDB_CHANNEL_ID
+from config import LOG_CHANNEL_ID, BOT_USERNAME, BACKUP_CHANNEL_LINK, CF_DOMAIN, TMDB_CHANNEL_ID, UPDATE_CHANNEL_ID
 from utility import (
     add_user,
     is_token_valid,
@@ -15,15 +15,14 @@ from utility import (
     safe_api_call,
     is_user_subscribed,
     auto_delete_message,
-    get_allowed_channels,
-    queue_file_for_processing,
-    file_queue,
+    is_allowed_channel,
     is_user_authorized,
-    tokens_col,
-    generate_token, get_token_link,
-    shorten_url,
+    get_verify_link,
+    set_membership,
+    is_member_status,
 )
 from query_helper import store_query
+from ingest_queue import queue_file_for_processing, CLASS_LIVE
 from app import bot
 
 logger = logging.getLogger(__name__)
@@ -35,7 +34,7 @@ async def start_handler(client, message):
         user_link = await get_user_link(message.from_user)
         first_name = message.from_user.first_name or "there"
         username = message.from_user.username or None
-        user_doc = await add_user(user_id)
+        user_doc = await add_user(user_id, message.from_user.first_name, username)
         joined_date = user_doc.get("joined", "Unknown")
         joined_str = joined_date.strftime("%Y-%m-%d %H:%M") if isinstance(joined_date, datetime) else str(joined_date)
 
@@ -88,10 +87,7 @@ async def start_handler(client, message):
         # --- Authorized or new user ---
         short_link = None
         if not await is_user_authorized(user_id):
-            now = datetime.now(timezone.utc)
-            token_doc = await tokens_col.find_one({"user_id": user_id, "expiry": {"$gt": now}})
-            token_id = token_doc["token_id"] if token_doc else await generate_token(user_id)
-            short_link = await shorten_url(get_token_link(token_id, BOT_USERNAME))
+            short_link = await get_verify_link(user_id, BOT_USERNAME)
         
         buttons = []
         if short_link:
@@ -127,11 +123,10 @@ async def start_handler(client, message):
 @bot.on_message(filters.channel & (filters.document | filters.video | filters.audio | filters.photo))
 async def channel_file_handler(client, message):
     try:
-        allowed_channels = await get_allowed_channels()
-        if message.chat.id not in allowed_channels:
+        if not is_allowed_channel(message.chat.id):
             return
 
-        asyncio.create_task(queue_file_for_processing(message))
+        asyncio.create_task(queue_file_for_processing(message, priority_class=CLASS_LIVE))
 
     except Exception as e:
         logger.error(f"Error in channel_file_handler: {e}")
@@ -147,8 +142,21 @@ async def delete_service_messages(client, message):
 async def approve_join_request_handler(client, join_request):
     try:
         await client.approve_chat_join_request(join_request.chat.id, join_request.from_user.id)
+        if join_request.chat.id == UPDATE_CHANNEL_ID:
+            set_membership(join_request.from_user.id, True)
         await safe_api_call(lambda: bot.send_message(LOG_CHANNEL_ID, f"✅ Approved join request for {join_request.from_user.mention} in {join_request.chat.title}"))
-    except (ChatAdminRequired, UserAlreadyParticipant) as e:
+    except UserAlreadyParticipant as e:
+        if join_request.chat.id == UPDATE_CHANNEL_ID:
+            set_membership(join_request.from_user.id, True)
+        logger.warning(f"Could not approve join request: {e}")
+    except ChatAdminRequired as e:
         logger.warning(f"Could not approve join request: {e}")
     except Exception as e:
         logger.error(f"Failed to approve join request: {e}")
+
+@bot.on_chat_member_updated(filters.chat(UPDATE_CHANNEL_ID))
+async def update_channel_member_handler(client, update):
+    """Keeps the membership cache in step with joins, leaves and bans in the updates channel."""
+    member = update.new_chat_member or update.old_chat_member
+    if member and member.user:
+        set_membership(member.user.id, is_member_status(update.new_chat_member))
@@ -0,0 +1,221 @@
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timezone
+from db import ingest_jobs_col, file_queue_col
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Ingest Job Tracking
+# =========================
+# Every /index, /copy and /update run gets an IngestJob with its own counters.
+# Counters live in memory and are flushed to `ingest_jobs_col` periodically,
+# which also keeps the history of finished runs.
+
+JOB_RUNNING = "running"
+JOB_FINISHED = "finished"
+
+COUNTERS = ("queued", "done", "duplicate", "failed", "tmdb_matched")
+
+active_jobs = {}
+
+class IngestJob:
+    def __init__(self, kind, channel_id, start_id, end_id, job_id=None):
+        self.job_id = job_id or uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.channel_id = channel_id
+        self.start_id = start_id
+        self.end_id = end_id
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.started_at = datetime.now(timezone.utc)
+        self.finished_at = None
+        self.enqueue_done = False
+        self.dirty = True
+
+    @classmethod
+    def from_doc(cls, doc):
+        job = cls(doc["kind"], doc.get("channel_id"), doc.get("start_id"), doc.get("end_id"), job_id=doc["_id"])
+        job.counters.update({key: doc.get(key, 0) for key in COUNTERS})
+        job.started_at = doc["started_at"]
+        if job.started_at.tzinfo is None:
+            job.started_at = job.started_at.replace(tzinfo=timezone.utc)
+        job.enqueue_done = doc.get("enqueue_done", False)
+        return job
+
+    @property
+    def processed(self):
+        return self.counters["done"] + self.counters["duplicate"] + self.counters["failed"]
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    def elapsed(self):
+        end = self.finished_at or datetime.now(timezone.utc)
+        return (end - self.started_at).total_seconds()
+
+    def throughput(self):
+        """Processed files per second since the job started."""
+        elapsed = self.elapsed()
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def eta_seconds(self):
+        rate = self.throughput()
+        remaining = self.counters["queued"] - self.processed
+        if remaining <= 0:
+            return 0
+        return remaining / rate if rate > 0 else None
+
+    def to_doc(self):
+        return {
+            "_id": self.job_id,
+            "kind": self.kind,
+            "channel_id": self.channel_id,
+            "start_id": self.start_id,
+            "end_id": self.end_id,
+            **self.counters,
+            "state": JOB_FINISHED if self.finished else JOB_RUNNING,
+            "enqueue_done": self.enqueue_done,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "files_per_second": round(self.throughput(), 3),
+            "eta_seconds": self.eta_seconds(),
+        }
+
+    def summary(self):
+        c = self.counters
+        eta = self.eta_seconds()
+        eta_text = f"{int(eta // 60)}m {int(eta % 60)}s" if eta is not None else "unknown"
+        text = (
+            f"<b>Job:</b> <code>{self.job_id}</code> ({self.kind})\n"
+            f"<b>Processed:</b> {self.processed}/{c['queued']}"
+            f"{'' if self.enqueue_done else '+'}\n"
+            f"<b>Saved:</b> {c['done']} | <b>Duplicate:</b> {c['duplicate']} | <b>Failed:</b> {c['failed']}\n"
+            f"<b>TMDB matched:</b> {c['tmdb_matched']}\n"
+            f"<b>Speed:</b> {self.throughput():.2f} files/s"
+        )
+        if not self.finished:
+            text += f" | <b>ETA:</b> {eta_text}"
+        return text
+
+async def start_job(kind, channel_id=None, start_id=None, end_id=None):
+    job = IngestJob(kind, channel_id, start_id, end_id)
+    active_jobs[job.job_id] = job
+    await ingest_jobs_col.insert_one(job.to_doc())
+    job.dirty = False
+    return job
+
+def get_job(job_id):
+    return active_jobs.get(job_id)
+
+def record(job_id, outcome, tmdb_matched=False):
+    """Counts one outcome ("queued", "done", "duplicate" or "failed") for a job."""
+    job = active_jobs.get(job_id)
+    if not job:
+        return
+    job.counters[outcome] += 1
+    if tmdb_matched:
+        job.counters["tmdb_matched"] += 1
+    job.dirty = True
+    _check_finished(job)
+
+def release(job_id):
+    """Undoes a "queued" count when another job takes the file over."""
+    job = active_jobs.get(job_id)
+    if job and job.counters["queued"] > 0:
+        job.counters["queued"] -= 1
+        job.dirty = True
+        _check_finished(job)
+
+def finish_enqueue(job):
+    """Marks that the producer has queued everything for this job."""
+    job.enqueue_done = True
+    job.dirty = True
+    _check_finished(job)
+
+def _check_finished(job):
+    if job.enqueue_done and not job.finished and job.processed >= job.counters["queued"]:
+        job.finished_at = datetime.now(timezone.utc)
+        job.dirty = True
+        asyncio.create_task(_flush_job(job))
+
+async def _flush_job(job):
+    job.dirty = False
+    doc = job.to_doc()
+    await ingest_jobs_col.update_one({"_id": job.job_id}, {"$set": doc}, upsert=True)
+    if job.finished:
+        active_jobs.pop(job.job_id, None)
+        rate = doc["files_per_second"]
+        logger.info(f"Ingest job {job.job_id} ({job.kind}) finished: {job.counters} in {job.elapsed():.0f}s ({rate} files/s)")
+
+async def flush_jobs():
+    for job in list(active_jobs.values()):
+        if job.dirty:
+            await _flush_job(job)
+
+async def periodic_job_flush(interval_seconds=10):
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await flush_jobs()
+        except Exception as e:
+            logger.error(f"Failed to flush ingest jobs: {e}")
+
+async def _recount_jobs(jobs):
+    """
+    Recomputes counters from the file queue, since the last flush may be up to
+    a flush interval older than what the previous process had processed.
+    """
+    counts = {job.job_id: dict.fromkeys(COUNTERS, 0) for job in jobs}
+    pipeline = [
+        {"$match": {"job_id": {"$in": list(counts)}}},
+        {"$group": {
+            "_id": {"job_id": "$job_id", "state": "$state", "outcome": "$outcome"},
+            "files": {"$sum": 1},
+            "tmdb_matched": {"$sum": {"$cond": ["$tmdb_matched", 1, 0]}},
+        }},
+    ]
+    async for group in file_queue_col.aggregate(pipeline):
+        counters = counts[group["_id"]["job_id"]]
+        state = group["_id"]["state"]
+        counters["queued"] += group["files"]
+        # States of ingest_queue, which imports this module
+        if state == "done":
+            counters[group["_id"].get("outcome") or "done"] += group["files"]
+            counters["tmdb_matched"] += group["tmdb_matched"]
+        elif state == "dead":
+            counters["failed"] += group["files"]
+
+    for job in jobs:
+        recounted = counts[job.job_id]
+        processed = recounted["done"] + recounted["duplicate"] + recounted["failed"]
+        # Finished queue entries expire after a day, the flushed counters still
+        # include those; count them as queued too so only files that are really
+        # pending keep the job running
+        for key in ("done", "duplicate", "failed", "tmdb_matched"):
+            job.counters[key] = max(job.counters[key], recounted[key])
+        job.counters["queued"] = recounted["queued"] + job.processed - processed
+        job.dirty = True
+
+async def restore_jobs():
+    """Reloads jobs that were still running when the previous process stopped."""
+    await ingest_jobs_col.create_index("started_at")
+    jobs = [IngestJob.from_doc(doc) async for doc in ingest_jobs_col.find({"state": JOB_RUNNING})]
+    if jobs:
+        await _recount_jobs(jobs)
+    for job in jobs:
+        active_jobs[job.job_id] = job
+        if not job.enqueue_done:
+            # The producer died with the process, only already queued files will arrive
+            logger.warning(f"Ingest job {job.job_id} ({job.kind}) was interrupted while queuing, re-run the rest of its range.")
+            finish_enqueue(job)
+        else:
+            # Its last files may have been processed after the final flush
+            _check_finished(job)
+
+async def list_jobs(history=10):
+    """Returns running jobs (live counters) and the most recent finished ones."""
+    running = [job.to_doc() for job in active_jobs.values()]
+    finished = await ingest_jobs_col.find({"state": JOB_FINISHED}).sort("started_at", -1).limit(history).to_list(length=history)
+    return {"running": running, "finished": finished}
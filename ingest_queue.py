@@ -0,0 +1,309 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from datetime import datetime, timezone, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from db import file_queue_col
+from cache import invalidate_cache
+from metrics import Gauge, ingest_stage_seconds, ingest_jobs
+from ingest_jobs import record as record_job_outcome, release as release_job_file
+from utility import (
+    extract_file_info,
+    upsert_file_info,
+    handle_duplicate_file,
+    process_audio_file,
+    safe_api_call,
+)
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Durable File Processing Queue
+# =========================
+# Jobs live in `file_queue_col` keyed by "<channel_id>:<message_id>" so that
+# re-queuing the same message is an idempotent upsert. The in-memory scheduler
+# only holds job keys and is rebuilt from Mongo on startup.
+
+STATE_PENDING = "pending"
+STATE_LEASED = "leased"
+STATE_DONE = "done"
+STATE_DEAD = "dead"
+
+LEASE_SECONDS = 10 * 60
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF_SECONDS = 30
+DONE_RETENTION_SECONDS = 24 * 60 * 60
+# Backfill producers wait while this many jobs are queued
+QUEUE_LIMIT = 500
+
+# Priority classes, served strictly in this order
+CLASS_LIVE = 0   # new posts in allowed channels
+CLASS_ADMIN = 1  # small owner-triggered ranges
+CLASS_BULK = 2   # /index and /copy backfills
+CLASS_NAMES = {CLASS_LIVE: "live", CLASS_ADMIN: "admin", CLASS_BULK: "bulk"}
+
+class FairScheduler:
+    """
+    Picks the next job key: the highest priority class with work wins, and
+    channels within a class take turns (round-robin), FIFO per channel.
+    """
+
+    def __init__(self):
+        self._classes = {priority_class: OrderedDict() for priority_class in CLASS_NAMES}
+        self._keys = set()
+        self._ready = asyncio.Event()
+        self._room = asyncio.Event()
+        self._room.set()
+
+    def put(self, priority_class, channel_id, key):
+        if key in self._keys:
+            return
+        self._keys.add(key)
+        channels = self._classes.get(priority_class, self._classes[CLASS_BULK])
+        channels.setdefault(channel_id, deque()).append(key)
+        self._ready.set()
+
+    async def get(self):
+        while True:
+            for channels in self._classes.values():
+                if channels:
+                    channel_id, keys = channels.popitem(last=False)
+                    key = keys.popleft()
+                    if keys:
+                        # Back of the line, the next channel goes first
+                        channels[channel_id] = keys
+                    self._keys.discard(key)
+                    self._room.set()
+                    return key
+            self._ready.clear()
+            await self._ready.wait()
+
+    async def wait_for_room(self, limit):
+        while len(self._keys) >= limit:
+            self._room.clear()
+            await self._room.wait()
+
+    def qsize(self):
+        return len(self._keys)
+
+    def depth(self):
+        return {
+            CLASS_NAMES[priority_class]: sum(len(keys) for keys in channels.values())
+            for priority_class, channels in self._classes.items()
+        }
+
+file_queue = FairScheduler()
+
+def job_key(file_info):
+    return f"{file_info['channel_id']}:{file_info['message_id']}"
+
+def get_queue_size():
+    """Returns the number of jobs waiting in the processing queue."""
+    return file_queue.qsize()
+
+def get_queue_depth():
+    """Returns the number of waiting jobs per priority class."""
+    return file_queue.depth()
+
+Gauge(
+    "file_queue_depth", "Jobs waiting in the file processing queue, by priority class.", ("priority_class",),
+    collect=lambda: {(priority_class,): depth for priority_class, depth in get_queue_depth().items()},
+)
+
+def _push(job):
+    file_queue.put(job.get("priority_class", CLASS_BULK), job.get("channel_id"), job["_id"])
+
+async def enqueue_file(file_info, log_duplicates=True, is_audio=False, priority_class=CLASS_BULK, job_id=None):
+    """Stores a job for `file_info` and schedules it. Returns False if it is already being processed."""
+    key = job_key(file_info)
+    now = datetime.now(timezone.utc)
+    try:
+        previous = await file_queue_col.find_one_and_update(
+            {"_id": key, "state": {"$ne": STATE_LEASED}},
+            {
+                "$set": {
+                    "file_info": file_info,
+                    "log_duplicates": log_duplicates,
+                    "is_audio": is_audio,
+                    "priority_class": priority_class,
+                    "channel_id": file_info["channel_id"],
+                    "job_id": job_id,
+                    "state": STATE_PENDING,
+                    "attempts": 0,
+                    "updated_at": now,
+                },
+                "$setOnInsert": {"created_at": now},
+                "$unset": {"finished_at": "", "last_error": "", "outcome": "", "tmdb_matched": ""},
+            },
+            upsert=True,
+            projection={"state": 1, "job_id": 1},
+        )
+    except DuplicateKeyError:
+        # A worker holds the lease on this job right now
+        return False
+    if previous and previous.get("state") == STATE_PENDING and previous.get("job_id") not in (None, job_id):
+        release_job_file(previous["job_id"])
+    _push({"_id": key, "channel_id": file_info["channel_id"], "priority_class": priority_class})
+    return True
+
+async def queue_file_for_processing(
+    message, channel_id=None, reply_func=None, log_duplicates=True, priority_class=CLASS_BULK, job_id=None
+):
+    try:
+        file_info = extract_file_info(message, channel_id=channel_id)
+        if file_info["file_name"]:
+            if priority_class != CLASS_LIVE:
+                await file_queue.wait_for_room(QUEUE_LIMIT)
+            queued = await enqueue_file(
+                file_info,
+                log_duplicates=log_duplicates,
+                is_audio=bool(message.audio),
+                priority_class=priority_class,
+                job_id=job_id,
+            )
+            if queued:
+                record_job_outcome(job_id, "queued")
+    except Exception as e:
+        if reply_func:
+            await safe_api_call(lambda: reply_func(f"❌ Error queuing file: {e}"))
+
+async def _lease(key):
+    now = datetime.now(timezone.utc)
+    return await file_queue_col.find_one_and_update(
+        {"_id": key, "state": STATE_PENDING},
+        {
+            "$set": {"state": STATE_LEASED, "lease_until": now + timedelta(seconds=LEASE_SECONDS)},
+            "$inc": {"attempts": 1},
+        },
+        return_document=ReturnDocument.AFTER,
+    )
+
+async def _complete(job, outcome, tmdb_matched=False):
+    # The outcome lets restore_jobs() recount a job's progress after a crash
+    await file_queue_col.update_one(
+        {"_id": job["_id"]},
+        {
+            "$set": {
+                "state": STATE_DONE,
+                "outcome": outcome,
+                "tmdb_matched": tmdb_matched,
+                "finished_at": datetime.now(timezone.utc),
+            },
+            "$unset": {"lease_until": ""},
+        },
+    )
+
+async def _fail(job, error):
+    attempts = job.get("attempts", 1)
+    if attempts >= MAX_ATTEMPTS:
+        await file_queue_col.update_one(
+            {"_id": job["_id"]},
+            {"$set": {"state": STATE_DEAD, "last_error": str(error)}, "$unset": {"lease_until": ""}},
+        )
+        logger.error(f"❌ Giving up on {job['_id']} after {attempts} attempts: {error}")
+        record_job_outcome(job.get("job_id"), "failed")
+        return
+
+    await file_queue_col.update_one(
+        {"_id": job["_id"]},
+        {"$set": {"state": STATE_PENDING, "last_error": str(error)}, "$unset": {"lease_until": ""}},
+    )
+    delay = RETRY_BACKOFF_SECONDS * attempts
+    logger.warning(f"Retrying {job['_id']} in {delay}s (attempt {attempts}/{MAX_ATTEMPTS}): {error}")
+    asyncio.get_running_loop().call_later(delay, _push, job)
+
+async def process_job(bot, job):
+    """
+    Runs a single job and returns its outcome, "duplicate" or "done".
+    Safe to repeat: every step is an upsert or a duplicate check.
+    """
+    from tmdb import process_tmdb_info
+    file_info = job["file_info"]
+
+    with ingest_stage_seconds.time(stage="duplicate_check"):
+        if await handle_duplicate_file(bot, file_info, job.get("log_duplicates", True)):
+            return "duplicate"
+
+    # Process TMDB info before upserting
+    with ingest_stage_seconds.time(stage="tmdb"):
+        await process_tmdb_info(bot, file_info)
+
+    # Upsert file_info after TMDB processing
+    with ingest_stage_seconds.time(stage="upsert"):
+        await upsert_file_info(file_info)
+
+    if job.get("is_audio"):
+        with ingest_stage_seconds.time(stage="audio"):
+            message = await safe_api_call(
+                lambda: bot.get_messages(file_info["channel_id"], file_info["message_id"])
+            )
+            if message and message.audio:
+                await process_audio_file(bot, message)
+    return "done"
+
+async def file_queue_worker(bot):
+    while True:
+        key = await file_queue.get()
+        try:
+            job = await _lease(key)
+            if not job:
+                continue
+            try:
+                outcome = await process_job(bot, job)
+                tmdb_matched = outcome == "done" and bool(job["file_info"].get("tmdb_id"))
+                await _complete(job, outcome, tmdb_matched)
+                ingest_jobs.inc(outcome=outcome)
+                record_job_outcome(job.get("job_id"), outcome, tmdb_matched=tmdb_matched)
+            except Exception as e:
+                logger.error(f"❌ Error saving file: {e}")
+                ingest_jobs.inc(outcome="error")
+                await _fail(job, e)
+        except Exception as e:
+            logger.error(f"❌ File queue error for {key}: {e}")
+        finally:
+            invalidate_cache()
+
+async def requeue_expired_leases():
+    """Returns jobs whose lease ran out (e.g. a stuck worker) to the queue."""
+    now = datetime.now(timezone.utc)
+    async for job in file_queue_col.find(
+        {"state": STATE_LEASED, "lease_until": {"$lt": now}},
+        {"priority_class": 1, "channel_id": 1},
+    ):
+        result = await file_queue_col.update_one(
+            {"_id": job["_id"], "state": STATE_LEASED},
+            {"$set": {"state": STATE_PENDING}, "$unset": {"lease_until": ""}},
+        )
+        if result.modified_count:
+            _push(job)
+
+async def periodic_lease_check(interval_seconds=60):
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await requeue_expired_leases()
+        except Exception as e:
+            logger.error(f"Lease check failed: {e}")
+
+async def restore_file_queue():
+    """
+    Ensures indexes and reloads unfinished jobs on startup.
+    Leases still held in the database belong to the previous process and are released.
+    """
+    await file_queue_col.create_index([("state", 1), ("priority_class", 1)])
+    await file_queue_col.create_index("finished_at", expireAfterSeconds=DONE_RETENTION_SECONDS)
+    await file_queue_col.update_many(
+        {"state": STATE_LEASED},
+        {"$set": {"state": STATE_PENDING}, "$unset": {"lease_until": ""}},
+    )
+    restored = 0
+    cursor = file_queue_col.find(
+        {"state": STATE_PENDING},
+        {"priority_class": 1, "channel_id": 1},
+    ).sort([("priority_class", 1), ("file_info.message_id", 1)])
+    async for job in cursor:
+        _push(job)
+        restored += 1
+    if restored:
+        logger.info(f"Resuming {restored} queued files from the previous run.")
@@ -0,0 +1,178 @@
+import time
+import bisect
+import aiohttp
+from contextlib import contextmanager
+
+# =========================
+# Metrics
+# =========================
+# A small in-process registry rendered in the Prometheus text format on
+# GET /metrics. Counters and histograms are updated where things happen;
+# gauges that mirror existing state (queue depth, cache size) read it when
+# scraped instead of being kept in sync.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+registry = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield self.name, key, (), value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for name, key, extra, value in self.samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        """`collect`, if given, returns the current {label tuple: value} (or one value) at scrape time."""
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+    def samples(self):
+        if self.collect is not None:
+            values = self.collect()
+            self.values = values if isinstance(values, dict) else {(): values}
+        yield from super().samples()
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        series = self.values.get(key)
+        if series is None:
+            # Per-bucket counts (plus +Inf), sum, count
+            series = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        for key, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", key, (("le", _format_value(float(bound))),), cumulative
+            yield f"{self.name}_sum", key, (), total
+            yield f"{self.name}_count", key, (), count
+
+def render():
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# =========================
+# Shared Metrics
+# =========================
+
+http_requests = Counter(
+    "http_requests_total", "API requests by route and status.", ("method", "route", "status")
+)
+http_request_seconds = Histogram(
+    "http_request_duration_seconds", "API request latency by route.", ("method", "route")
+)
+
+cache_hits = Counter("cache_hits_total", "Cache lookups that found a live entry.", ("cache",))
+cache_misses = Counter("cache_misses_total", "Cache lookups that found nothing.", ("cache",))
+cache_evictions = Counter(
+    "cache_evictions_total", "Entries removed from a cache, by reason.", ("cache", "reason")
+)
+
+ingest_stage_seconds = Histogram(
+    "ingest_stage_duration_seconds", "Time spent in each file processing stage.", ("stage",)
+)
+ingest_jobs = Counter("ingest_jobs_total", "Processed file queue jobs by outcome.", ("outcome",))
+
+outbound_requests = Counter(
+    "outbound_http_requests_total", "Outgoing HTTP requests by host and status.", ("host", "status")
+)
+outbound_request_seconds = Histogram(
+    "outbound_http_request_duration_seconds", "Outgoing HTTP request latency by host.", ("host",)
+)
+
+telegram_calls = Counter(
+    "telegram_api_calls_total", "Telegram calls made through safe_api_call, by outcome.", ("outcome",)
+)
+telegram_flood_wait_seconds = Counter(
+    "telegram_flood_wait_seconds_total", "Seconds Telegram asked us to wait in FloodWait errors."
+)
+
+# =========================
+# Outbound HTTP Tracing
+# =========================
+
+async def _on_request_start(session, context, params):
+    context.started = time.perf_counter()
+
+async def _on_request_end(session, context, params):
+    host = params.url.host
+    outbound_request_seconds.observe(time.perf_counter() - context.started, host=host)
+    outbound_requests.inc(host=host, status=params.response.status)
+
+async def _on_request_exception(session, context, params):
+    host = params.url.host
+    outbound_request_seconds.observe(time.perf_counter() - context.started, host=host)
+    outbound_requests.inc(host=host, status="error")
+
+# Pass as `trace_configs=[http_trace_config]` when creating an aiohttp.ClientSession
+http_trace_config = aiohttp.TraceConfig()
+http_trace_config.on_request_start.append(_on_request_start)
+http_trace_config.on_request_end.append(_on_request_end)
+http_trace_config.on_request_exception.append(_on_request_exception)
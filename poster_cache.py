@@ -0,0 +1,150 @@
+import os
+import re
+import uuid
+import asyncio
+import logging
+import aiohttp
+from collections import OrderedDict
+from config import POSTER_CACHE_DIR, POSTER_CACHE_MAX_MB
+from metrics import http_trace_config
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Poster Thumbnail Cache
+# =========================
+# TMDB already serves every image in fixed widths, so a "variant" is just
+# the matching TMDB size. Files are fetched on first request into
+# POSTER_CACHE_DIR/<variant>/ and evicted least-recently-used once the
+# directory grows past POSTER_CACHE_MAX_MB. A poster path never changes
+# content, which lets clients cache the responses forever. Evicted files are
+# deleted EVICT_GRACE_SECONDS later, since a FileResponse handed their path
+# may not have opened it yet.
+
+TMDB_IMAGE_BASE_URL = "https://image.tmdb.org/t/p"
+POSTER_VARIANTS = {
+    "grid": "w342",     # index page cards
+    "detail": "w780",   # details page poster and backdrop
+    "profile": "w185",  # cast and crew photos
+}
+POSTER_PATH_PATTERN = re.compile(r"^[A-Za-z0-9_-]+\.(?:jpg|jpeg|png|webp)$")
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=30)
+EVICT_GRACE_SECONDS = 60
+
+class PosterNotFound(Exception):
+    pass
+
+class PosterCache:
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # relative path -> size, oldest first
+        self.total_bytes = 0
+        self.session = None
+        self.in_flight = {}
+
+    def load(self):
+        """Indexes files left by previous runs, oldest access first."""
+        files = []
+        for variant in POSTER_VARIANTS:
+            directory = os.path.join(self.root, variant)
+            os.makedirs(directory, exist_ok=True)
+            for entry in os.scandir(directory):
+                if not entry.is_file():
+                    continue
+                if entry.name.endswith(".part"):
+                    # Interrupted download
+                    os.remove(entry.path)
+                    continue
+                stat = entry.stat()
+                files.append((stat.st_mtime, os.path.join(variant, entry.name), stat.st_size))
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+        self._evict()
+        logger.info(f"Poster cache: {len(self.entries)} files, {self.total_bytes / 1024 / 1024:.1f} MB")
+
+    def _evict(self):
+        # The newest file always stays, it is about to be served
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                asyncio.get_running_loop().call_later(EVICT_GRACE_SECONDS, self._remove, key)
+            except RuntimeError:
+                # load() runs in a thread before anything is served
+                self._remove(key)
+
+    def _remove(self, key):
+        if key in self.entries or key in self.in_flight:
+            # Fetched again since it was evicted
+            return
+        try:
+            os.remove(os.path.join(self.root, key))
+        except FileNotFoundError:
+            pass
+
+    def _touch(self, key):
+        self.entries.move_to_end(key)
+        try:
+            # mtime doubles as the access time so the order survives restarts
+            os.utime(os.path.join(self.root, key))
+        except FileNotFoundError:
+            self.total_bytes -= self.entries.pop(key)
+            return False
+        return True
+
+    def _get_session(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=REQUEST_TIMEOUT, trace_configs=[http_trace_config])
+        return self.session
+
+    async def _fetch(self, variant, poster_path, key):
+        url = f"{TMDB_IMAGE_BASE_URL}/{POSTER_VARIANTS[variant]}/{poster_path}"
+        async with self._get_session().get(url) as response:
+            if response.status == 404:
+                raise PosterNotFound(poster_path)
+            response.raise_for_status()
+            data = await response.read()
+
+        path = os.path.join(self.root, key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.part"
+
+        def write():
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+
+        await asyncio.to_thread(write)
+        self.entries[key] = len(data)
+        self.total_bytes += len(data)
+        self._evict()
+
+    async def get(self, variant, poster_path):
+        """Returns the local file for a poster variant, fetching it on a miss."""
+        if variant not in POSTER_VARIANTS or not POSTER_PATH_PATTERN.match(poster_path):
+            raise PosterNotFound(poster_path)
+        key = os.path.join(variant, poster_path)
+        if key in self.entries and self._touch(key):
+            return os.path.join(self.root, key)
+
+        # Concurrent misses for the same file share one download
+        task = self.in_flight.get(key)
+        if task is None:
+            task = self.in_flight[key] = asyncio.ensure_future(self._fetch(variant, poster_path, key))
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        await asyncio.shield(task)
+        return os.path.join(self.root, key)
+
+    async def prewarm(self, poster_path, variants=("grid", "detail")):
+        """Fetches the usual variants of a new poster in the background."""
+        if not poster_path:
+            return
+        for variant in variants:
+            try:
+                await self.get(variant, poster_path.lstrip("/"))
+            except Exception as e:
+                logger.warning(f"Failed to prewarm {variant} poster {poster_path}: {e}")
+
+poster_cache = PosterCache(POSTER_CACHE_DIR, POSTER_CACHE_MAX_MB * 1024 * 1024)
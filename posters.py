@@ -0,0 +1,138 @@
+import base64
+import asyncio
+import hashlib
+import logging
+import aiohttp
+from datetime import datetime, timezone
+from pymongo.errors import DuplicateKeyError
+from db import posters_col
+from config import IMGBB_API_KEY
+from metrics import http_trace_config
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Poster Upload Pipeline
+# =========================
+# Posters are downloaded into memory and uploaded to imgbb over one shared
+# session. `posters_col` maps the sha256 of every uploaded image (and the
+# source URLs it came from) to its imgbb URL, so the same image is never
+# uploaded twice, whichever URL it is fetched from. Since one upload is
+# shared by every file using that image, its imgbb delete link stays in
+# `posters_col` (looked up by URL for the admin file list) and is not stored
+# per file.
+
+IMGBB_UPLOAD_URL = "https://api.imgbb.com/1/upload"
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+MAX_POSTER_BYTES = 32 * 1024 * 1024  # imgbb's upload limit
+POSTER_UPLOAD_CONCURRENCY = 4
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=60)
+
+_session = None
+_in_flight = {}
+_digests_in_flight = {}
+
+def get_session():
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(timeout=REQUEST_TIMEOUT, trace_configs=[http_trace_config])
+    return _session
+
+async def ensure_poster_indexes():
+    await posters_col.create_index("sha256", unique=True)
+    await posters_col.create_index("source_urls")
+    await posters_col.create_index("url")
+
+def _result(doc):
+    return {"url": doc["url"]}
+
+async def download_image(image_url):
+    async with get_session().get(image_url) as response:
+        if response.status != 200:
+            raise ValueError(f"Failed to download image from URL: Status {response.status}")
+        data = bytearray()
+        async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+            data += chunk
+            if len(data) > MAX_POSTER_BYTES:
+                raise ValueError("Image is larger than 32 MB.")
+    return bytes(data)
+
+async def _upload_image(data):
+    form = aiohttp.FormData()
+    form.add_field("image", base64.b64encode(data).decode("ascii"))
+    async with get_session().post(IMGBB_UPLOAD_URL, params={"key": IMGBB_API_KEY}, data=form) as response:
+        payload = await response.json(content_type=None)
+        if response.status != 200 or not payload.get("success"):
+            error = (payload.get("error") or {}).get("message", response.status)
+            raise ValueError(f"imgbb upload failed: {error}")
+    return {"url": payload["data"]["url"], "delete_url": payload["data"].get("delete_url")}
+
+async def _upload_poster(image_url):
+    known = await posters_col.find_one({"source_urls": image_url})
+    if known:
+        return _result(known)
+
+    data = await download_image(image_url)
+    digest = hashlib.sha256(data).hexdigest()
+    known = await posters_col.find_one_and_update({"sha256": digest}, {"$addToSet": {"source_urls": image_url}})
+    if known:
+        return _result(known)
+
+    # Two URLs serving the same image at the same time share one upload
+    task = _digests_in_flight.get(digest)
+    if task is None:
+        task = _digests_in_flight[digest] = asyncio.ensure_future(_store_upload(data, digest, image_url))
+        task.add_done_callback(lambda _: _digests_in_flight.pop(digest, None))
+        return await asyncio.shield(task)
+    uploaded = await asyncio.shield(task)
+    await posters_col.update_one({"sha256": digest}, {"$addToSet": {"source_urls": image_url}})
+    return uploaded
+
+async def _store_upload(data, digest, image_url):
+    uploaded = await _upload_image(data)
+    try:
+        await posters_col.insert_one({
+            "sha256": digest,
+            "source_urls": [image_url],
+            "size": len(data),
+            **uploaded,
+            "created_at": datetime.now(timezone.utc),
+        })
+    except DuplicateKeyError:
+        # Another process stored the same image first, keep a single mapping
+        known = await posters_col.find_one_and_update({"sha256": digest}, {"$addToSet": {"source_urls": image_url}})
+        return _result(known)
+    return _result(uploaded)
+
+async def upload_poster(image_url):
+    """
+    Returns {"url"} of `image_url` on imgbb, uploading it only if
+    neither the URL nor the image content was uploaded before.
+    """
+    if not image_url:
+        raise ValueError("Image URL cannot be empty.")
+    # Concurrent requests for one URL share a single upload
+    task = _in_flight.get(image_url)
+    if task is None:
+        task = _in_flight[image_url] = asyncio.ensure_future(_upload_poster(image_url))
+        task.add_done_callback(lambda _: _in_flight.pop(image_url, None))
+    try:
+        return await asyncio.shield(task)
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.error(f"Error during imgbb upload process: {e}")
+        raise ValueError(f"Failed to upload image to imgbb: {e}")
+
+async def upload_posters(poster_urls, concurrency=POSTER_UPLOAD_CONCURRENCY):
+    """Uploads many posters with bounded concurrency. Returns {url: result or ValueError}."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def upload(image_url):
+        async with semaphore:
+            try:
+                return image_url, await upload_poster(image_url)
+            except ValueError as e:
+                return image_url, e
+
+    return dict(await asyncio.gather(*(upload(url) for url in set(poster_urls))))
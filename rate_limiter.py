@@ -0,0 +1,127 @@
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+import aiohttp
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from config import TMDB_RATE_LIMIT, IMDB_RATE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Priorities (lower is served first)
+# =========================
+
+PRIORITY_INTERACTIVE = 0  # admin panel actions
+PRIORITY_INGEST = 1       # file queue worker
+PRIORITY_BULK = 2         # backfills such as update_ratings.py
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        """Seconds until a token is available."""
+        self._refill()
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+class UpstreamLimiter:
+    """
+    Rate limiter for a single upstream host.
+    Waiters are served in priority order, FIFO within the same priority.
+    """
+
+    def __init__(self, name, rate):
+        self.name = name
+        self.bucket = TokenBucket(rate, max(1, rate))
+        self.blocked_until = 0.0
+        self._waiters = []
+        self._counter = itertools.count()
+        self._dispatcher = None
+
+    async def acquire(self, priority=PRIORITY_INGEST):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    def back_off(self, seconds):
+        """Stop handing out tokens for `seconds` (e.g. after a 429)."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        logger.warning(f"{self.name} rate limited, backing off for {seconds:.1f}s")
+
+    def pending(self):
+        return len(self._waiters)
+
+    async def _dispatch(self):
+        while self._waiters:
+            # Drop waiters whose callers were cancelled
+            while self._waiters and self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+            if not self._waiters:
+                break
+            delay = max(self.blocked_until - time.monotonic(), self.bucket.delay())
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _priority, _seq, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self.bucket.take()
+            future.set_result(None)
+
+limiters = {
+    "tmdb": UpstreamLimiter("tmdb", TMDB_RATE_LIMIT),
+    "imdb": UpstreamLimiter("imdb", IMDB_RATE_LIMIT),
+}
+
+def parse_retry_after(value, default=1.0):
+    """Parses a Retry-After header given either in seconds or as an HTTP date."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return default
+
+async def fetch_json(session, url, upstream, priority=PRIORITY_INGEST, max_retries=3):
+    """
+    GET a JSON document through the limiter of the given upstream.
+    Retries on 429, honouring Retry-After. Returns (status, data).
+    """
+    limiter = limiters[upstream]
+    for attempt in range(max_retries + 1):
+        await limiter.acquire(priority)
+        async with session.get(url) as response:
+            if response.status == 429 and attempt < max_retries:
+                limiter.back_off(parse_retry_after(response.headers.get("Retry-After"), default=2 ** attempt))
+                continue
+            try:
+                data = await response.json(content_type=None)
+            except (aiohttp.ContentTypeError, ValueError):
+                data = {}
+            return response.status, data or {}
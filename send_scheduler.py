@@ -0,0 +1,107 @@
+import time
+import asyncio
+import logging
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Adaptive Telegram Send Scheduler
+# =========================
+# Every bot API call takes a token from the global bucket, and from the
+# target chat's bucket when a chat is known. Rates creep up while calls
+# succeed and are halved on FloodWait (additive increase, multiplicative
+# decrease), so throughput settles just under what Telegram tolerates.
+# A FloodWait on a call without a chat only slows that call site (e.g. the
+# get_messages loop of /index), not file deliveries and everything else.
+
+GLOBAL_RATE = (20.0, 1.0, 30.0)   # initial, min, max calls per second
+USER_CHAT_RATE = (1.0, 0.2, 2.0)
+GROUP_CHAT_RATE = (0.5, 0.05, 1.0)  # channels and groups (negative ids)
+RATE_INCREASE = 0.05  # share of the max rate added after each success
+
+class AdaptiveBucket:
+    def __init__(self, rate, min_rate, max_rate):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        capacity = max(1.0, self.rate)
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        # The lock keeps waiters in FIFO order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_INCREASE)
+
+    def on_flood_wait(self, seconds):
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0.0
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+global_bucket = AdaptiveBucket(*GLOBAL_RATE)
+chat_buckets = TTLCache(maxsize=10000, ttl=30 * 60)
+caller_buckets = TTLCache(maxsize=1000, ttl=30 * 60)  # only call sites that were flooded
+
+def get_chat_bucket(chat_id):
+    bucket = chat_buckets.get(chat_id)
+    if bucket is None:
+        limits = GROUP_CHAT_RATE if isinstance(chat_id, int) and chat_id < 0 else USER_CHAT_RATE
+        bucket = chat_buckets[chat_id] = AdaptiveBucket(*limits)
+    return bucket
+
+async def acquire(chat_id=None, caller=None):
+    """Waits until a call to `chat_id` (or any call, if None) from `caller` may be made."""
+    if chat_id is not None:
+        await get_chat_bucket(chat_id).acquire()
+    elif caller is not None and caller in caller_buckets:
+        await caller_buckets[caller].acquire()
+    await global_bucket.acquire()
+
+def on_success(chat_id=None, caller=None):
+    global_bucket.on_success()
+    if chat_id is not None:
+        get_chat_bucket(chat_id).on_success()
+    elif caller is not None and caller in caller_buckets:
+        caller_buckets[caller].on_success()
+
+def on_flood_wait(seconds, chat_id=None, caller=None):
+    """
+    Slows down the chat that was flooded, or else the call site that was.
+    Only a flood with neither known holds back every call.
+    """
+    if chat_id is not None:
+        bucket, target = get_chat_bucket(chat_id), chat_id
+    elif caller is not None:
+        bucket = caller_buckets.get(caller)
+        if bucket is None:
+            bucket = caller_buckets[caller] = AdaptiveBucket(*GLOBAL_RATE)
+        target = f"{getattr(caller, 'co_filename', caller)}:{getattr(caller, 'co_firstlineno', '')}"
+    else:
+        bucket, target = global_bucket, "global"
+    bucket.on_flood_wait(seconds)
+    logger.warning(f"FloodWait {seconds}s for {target}, rate lowered to {bucket.rate:.2f}/s")
+
+def current_rates():
+    return {
+        "global": round(global_bucket.rate, 2),
+        "chats": {chat_id: round(bucket.rate, 2) for chat_id, bucket in list(chat_buckets.items())},
+    }
@@ -1,4 +1,7 @@
 
 // API configuration
 const API_BASE_URL = ""; // Replace with your live backend URL
-const POSTER_BASE_URL = "https://image.tmdb.org/t/p/w1280"; // Assuming this is the poster base URL
+// Posters are served through the backend's resizing cache (/api/poster/{variant}/{path})
+const POSTER_BASE_URL = `${API_BASE_URL}/api/poster/detail`; // details page poster and backdrop
+const GRID_POSTER_BASE_URL = `${API_BASE_URL}/api/poster/grid`; // index page cards
+const PROFILE_BASE_URL = `${API_BASE_URL}/api/poster/profile`; // cast and crew photos
@@ -2,10 +2,14 @@
 import re
 import aiohttp
 import asyncio
-import PTN
-from config import TMDB_API_KEY, logger, TMDB_CHANNEL_ID, SEND_UPDATES, UPDATE_CHANNEL_ID
+from config import TMDB_API_KEY, logger, TMDB_CHANNEL_ID, SEND_UPDATES, UPDATE_CHANNEL_ID, POSTER_PREWARM
 from db import tmdb_col, genres_col, stars_col, directors_col, languages_col
-from utility import safe_api_call, remove_redandent
+from utility import safe_api_call
+from filename_parser import parse_title
+from rate_limiter import fetch_json, PRIORITY_INGEST
+from dimensions import genre_resolver, star_resolver, director_resolver, language_resolver
+from poster_cache import poster_cache
+from metrics import http_trace_config, ingest_stage_seconds
 from pyrogram import enums
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
@@ -44,114 +48,85 @@ def extract_genres(data):
             genres.append(genre['name']) 
     return genres 
 
-async def get_or_create_person(person_data, collection):
-    person = await collection.find_one({"name": person_data["name"]})
-    if person:
-        return person["_id"]
-    else:
-        result = await collection.insert_one(person_data)
-        return result.inserted_id
-
-async def get_or_create_genre(genre_name):
-    genre = await genres_col.find_one({"name": genre_name})
-    if genre:
-        return genre["_id"]
-    else:
-        result = await genres_col.insert_one({"name": genre_name})
-        return result.inserted_id
-
-async def get_or_create_language(language_name):
-    language = await languages_col.find_one({"name": language_name})
-    if language:
-        return language["_id"]
-    else:
-        result = await languages_col.insert_one({"name": language_name})
-        return result.inserted_id
-
-async def get_imdb_details(imdb_id):
+async def get_imdb_details(imdb_id, priority=PRIORITY_INGEST):
     if not imdb_id:
         return {}
     try:
         url = f"https://imdb.iamidiotareyoutoo.com/search?tt={imdb_id}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                data = await resp.json()
-                if resp.status != 200:
-                    logger.warning(f"IMDB returned error for {imdb_id}: {data.get('Error')}")
-                    return {}
-                return {
-                    "rating": data.get("short", {}).get("aggregateRating", {}).get("ratingValue"),
-                    "plot": data.get("short", {}).get("description")
-                }
+        async with aiohttp.ClientSession(trace_configs=[http_trace_config]) as session:
+            status, data = await fetch_json(session, url, "imdb", priority)
+            if status != 200:
+                logger.warning(f"IMDB returned error for {imdb_id}: {data.get('Error')}")
+                return {}
+            return {
+                "rating": data.get("short", {}).get("aggregateRating", {}).get("ratingValue"),
+                "plot": data.get("short", {}).get("description")
+            }
     except Exception as e:
         logger.error(f"IMDb API error: {e}")
         return {}
 
-async def get_cast_and_crew(session, tmdb_type, tmdb_id):
+async def get_cast_and_crew(session, tmdb_type, tmdb_id, priority=PRIORITY_INGEST):
     cast = []
     directors = []
     credits_url = f'https://api.themoviedb.org/3/{tmdb_type}/{tmdb_id}/credits?api_key={TMDB_API_KEY}&language=en-US'
-    async with session.get(credits_url) as response:
-        credits_data = await response.json()
-        for member in credits_data.get('cast', [])[:5]:
-            cast.append({'name': member['name'], 'profile_path': member['profile_path']})
-        for member in credits_data.get('crew', []):
-            if member['job'] == 'Director':
-                directors.append({'name': member['name'], 'profile_path': member['profile_path']})
+    _status, credits_data = await fetch_json(session, credits_url, "tmdb", priority)
+    for member in credits_data.get('cast', [])[:5]:
+        cast.append({'name': member['name'], 'profile_path': member['profile_path']})
+    for member in credits_data.get('crew', []):
+        if member['job'] == 'Director':
+            directors.append({'name': member['name'], 'profile_path': member['profile_path']})
     return {"cast": cast, "directors": directors}
 
-async def get_tv_imdb_id(session, tv_id):
+async def get_tv_imdb_id(session, tv_id, priority=PRIORITY_INGEST):
     url = f"https://api.themoviedb.org/3/tv/{tv_id}/external_ids?api_key={TMDB_API_KEY}"
-    async with session.get(url) as resp:
-        data = await resp.json()
-        return data.get("imdb_id")
+    _status, data = await fetch_json(session, url, "tmdb", priority)
+    return data.get("imdb_id")
 
-async def get_info(tmdb_type, tmdb_id):
+async def get_info(tmdb_type, tmdb_id, priority=PRIORITY_INGEST):
     api_url = f"https://api.themoviedb.org/3/{tmdb_type}/{tmdb_id}?api_key={TMDB_API_KEY}&language=en-US"
-    async with aiohttp.ClientSession() as session:
-        async with session.get(api_url) as detail_response:
-            if detail_response.status != 200:
-                return {"message": f"Error: TMDB API returned status {detail_response.status}"}
-            data = await detail_response.json()
-            imdb_id = data.get('imdb_id') if tmdb_type == 'movie' else await get_tv_imdb_id(session, tmdb_id)
-            imdb_info = await get_imdb_details(imdb_id) if imdb_id else {}
-            cast_crew = await get_cast_and_crew(session, tmdb_type, tmdb_id)
-            trailer_url = None
-            video_url = f'https://api.themoviedb.org/3/{tmdb_type}/{tmdb_id}/videos?api_key={TMDB_API_KEY}'
-            async with session.get(video_url) as video_response:
-                video_data = await video_response.json()
-                for video in video_data.get('results', []):
-                    if video['site'] == 'YouTube' and video['type'] == 'Trailer':
-                        trailer_url = f"https://www.youtube.com/watch?v={video['key']}"
-                        break
-            
-            info = {
-                "tmdb_id": tmdb_id,
-                "tmdb_type": tmdb_type,
-                "imdb_id": imdb_id,
-                "title": data.get('title') if tmdb_type == 'movie' else data.get('name'),
-                "year": (data.get('release_date', '')[:4] if tmdb_type == 'movie' else data.get('first_air_date', '')[:4]),
-                "rating": imdb_info.get('rating'),
-                "plot": truncate_overview(imdb_info.get('plot') or data.get('overview')),
-                "poster_path": data.get('poster_path'),
-                "poster_url": f"{POSTER_BASE_URL}{data.get('poster_path')}" if data.get('poster_path') else None,
-                "trailer_url": trailer_url,
-                "genres": extract_genres(data),
-                "cast": cast_crew.get('cast', []),
-                "directors": cast_crew.get('directors', []),
-                "spoken_languages": [lang.get('name', '') for lang in data.get('spoken_languages', [])],
-                "runtime": data.get('runtime'),
-            }
+    async with aiohttp.ClientSession(trace_configs=[http_trace_config]) as session:
+        status, data = await fetch_json(session, api_url, "tmdb", priority)
+        if status != 200:
+            return {"message": f"Error: TMDB API returned status {status}"}
+        imdb_id = data.get('imdb_id') if tmdb_type == 'movie' else await get_tv_imdb_id(session, tmdb_id, priority)
+        imdb_info = await get_imdb_details(imdb_id, priority) if imdb_id else {}
+        cast_crew = await get_cast_and_crew(session, tmdb_type, tmdb_id, priority)
+        trailer_url = None
+        video_url = f'https://api.themoviedb.org/3/{tmdb_type}/{tmdb_id}/videos?api_key={TMDB_API_KEY}'
+        _status, video_data = await fetch_json(session, video_url, "tmdb", priority)
+        for video in video_data.get('results', []):
+            if video['site'] == 'YouTube' and video['type'] == 'Trailer':
+                trailer_url = f"https://www.youtube.com/watch?v={video['key']}"
+                break
+        
+        info = {
+            "tmdb_id": tmdb_id,
+            "tmdb_type": tmdb_type,
+            "imdb_id": imdb_id,
+            "title": data.get('title') if tmdb_type == 'movie' else data.get('name'),
+            "year": (data.get('release_date', '')[:4] if tmdb_type == 'movie' else data.get('first_air_date', '')[:4]),
+            "rating": imdb_info.get('rating'),
+            "plot": truncate_overview(imdb_info.get('plot') or data.get('overview')),
+            "poster_path": data.get('poster_path'),
+            "poster_url": f"{POSTER_BASE_URL}{data.get('poster_path')}" if data.get('poster_path') else None,
+            "trailer_url": trailer_url,
+            "genres": extract_genres(data),
+            "cast": cast_crew.get('cast', []),
+            "directors": cast_crew.get('directors', []),
+            "spoken_languages": [lang.get('name', '') for lang in data.get('spoken_languages', [])],
+            "runtime": data.get('runtime'),
+        }
 
-            if tmdb_type == 'tv':
-                info['directors'] = [{'name': creator['name'], 'profile_path': creator['profile_path']} for creator in data.get('created_by', [])]
-                seasons = []
-                for season in data.get('seasons', []):
-                    seasons.append({'season_number': season.get('season_number'), 'poster_path': season.get('poster_path'), 'episode_count': season.get('episode_count')})
-                info['seasons'] = seasons
+        if tmdb_type == 'tv':
+            info['directors'] = [{'name': creator['name'], 'profile_path': creator['profile_path']} for creator in data.get('created_by', [])]
+            seasons = []
+            for season in data.get('seasons', []):
+                seasons.append({'season_number': season.get('season_number'), 'poster_path': season.get('poster_path'), 'episode_count': season.get('episode_count')})
+            info['seasons'] = seasons
 
-            info['message'] = await format_tmdb_info(info, data)
-            return info
+        info['message'] = await format_tmdb_info(info, data)
+        return info
 
 async def format_tmdb_info(info, data):
     tmdb_type = info['tmdb_type']
@@ -238,10 +213,12 @@ async def format_tmdb_info_from_db(tmdb_document):
     return message.strip()
 
 async def upsert_tmdb_info(tmdb_id, tmdb_type, info):
-    genre_ids = [await get_or_create_genre(genre) for genre in info.get("genres", [])]
-    star_ids = [await get_or_create_person(star, stars_col) for star in info.get("cast", [])[:5]]
-    director_ids = [await get_or_create_person(director, directors_col) for director in info.get("directors", [])[:5]]
-    language_ids = [await get_or_create_language(lang) for lang in info.get("spoken_languages", [])]
+    genre_ids, star_ids, director_ids, language_ids = await asyncio.gather(
+        genre_resolver.resolve([{"name": genre} for genre in info.get("genres", [])]),
+        star_resolver.resolve(info.get("cast", [])[:5]),
+        director_resolver.resolve(info.get("directors", [])[:5]),
+        language_resolver.resolve([{"name": lang} for lang in info.get("spoken_languages", [])]),
+    )
     
     tmdb_document = {
         "tmdb_id": info["tmdb_id"],
@@ -261,26 +238,23 @@ async def upsert_tmdb_info(tmdb_id, tmdb_type, info):
     }
     if tmdb_type == 'tv':
         tmdb_document['seasons'] = info.get('seasons', [])
-    await tmdb_col.update_one(
+    previous = await tmdb_col.find_one_and_update(
         {"tmdb_id": tmdb_id, "tmdb_type": tmdb_type},
         {"$set": tmdb_document},
-        upsert=True
+        upsert=True,
+        projection={"poster_path": 1}
     )
+    poster_path = info["poster_path"]
+    if POSTER_PREWARM and poster_path and (not previous or previous.get("poster_path") != poster_path):
+        asyncio.create_task(poster_cache.prewarm(poster_path))
 
 async def process_tmdb_info(bot, file_info):
     if file_info["channel_id"] not in TMDB_CHANNEL_ID:
         return None
+    title = file_info["file_name"]
     try:
-        title = remove_redandent(file_info["file_name"])
-        parsed_data = PTN.parse(title)
-        title = parsed_data.get("title", "").replace("_", " ").replace("-", " ").replace(":", " ")
-        title = ' '.join(title.split())
-        aka_pattern = r'\sA[.\s]?K[.\s]?A[.]?\s+'
-        if re.search(aka_pattern, title, re.IGNORECASE):
-            title = re.split(aka_pattern, title, maxsplit=1, flags=re.IGNORECASE)[0].strip()
-        year = parsed_data.get("year")
-        season = parsed_data.get("season")
-        episode = parsed_data.get("episode")
+        with ingest_stage_seconds.time(stage="parse"):
+            title, year, season, episode = parse_title(file_info["file_name"])
         if season:
             file_info["season_number"] = season
         if season or episode:
@@ -300,7 +274,6 @@ async def process_tmdb_info(bot, file_info):
                 await upsert_tmdb_info(tmdb_id, tmdb_type, info)
                 if info.get("poster_url") and SEND_UPDATES:
                     keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("🎥 Trailer", url=info["trailer_url"])]]) if info.get("trailer_url") else None
-                    await asyncio.sleep(3)
                     await safe_api_call(
                         lambda: bot.send_photo(
                             UPDATE_CHANNEL_ID,
@@ -308,7 +281,8 @@ async def process_tmdb_info(bot, file_info):
                             caption=info["message"],
                             parse_mode=enums.ParseMode.HTML,
                             reply_markup=keyboard
-                        )
+                        ),
+                        chat_id=UPDATE_CHANNEL_ID,
                     )
         return tmdb_id, tmdb_type
     except Exception as e:
@@ -319,22 +293,20 @@ async def get_movie_id(title, year=None):
     search_url = f'https://api.themoviedb.org/3/search/movie?api_key={TMDB_API_KEY}&query={title}'
     if year:
         search_url += f'&year={year}'
-    async with aiohttp.ClientSession() as session:
-        async with session.get(search_url) as response:
-            data = await response.json()
-            if data.get('results'):
-                return {'id': data['results'][0]['id'], 'media_type': 'movie'}
+    async with aiohttp.ClientSession(trace_configs=[http_trace_config]) as session:
+        _status, data = await fetch_json(session, search_url, "tmdb")
+        if data.get('results'):
+            return {'id': data['results'][0]['id'], 'media_type': 'movie'}
     return None
 
 async def get_tv_id(title, year=None):
     search_url = f'https://api.themoviedb.org/3/search/tv?api_key={TMDB_API_KEY}&query={title}'
     if year:
         search_url += f'&first_air_date_year={year}'
-    async with aiohttp.ClientSession() as session:
-        async with session.get(search_url) as response:
-            data = await response.json()
-            if data.get('results'):
-                return {'id': data['results'][0]['id'], 'media_type': 'tv'}
+    async with aiohttp.ClientSession(trace_configs=[http_trace_config]) as session:
+        _status, data = await fetch_json(session, search_url, "tmdb")
+        if data.get('results'):
+            return {'id': data['results'][0]['id'], 'media_type': 'tv'}
     return None
 
 def truncate_overview(overview):
@@ -1,24 +1,9 @@
 from os import path as ospath, environ
 from subprocess import run as srun
-from requests import get as rget
 from dotenv import load_dotenv
+# Always fetch a fresh config.env here, bot.py then reuses it
+environ['CONFIG_FILE_MAX_AGE'] = '0'
 from config import logger
-CONFIG_FILE_URL = environ.get('CONFIG_FILE_URL')
-try:
-    if len(CONFIG_FILE_URL) == 0:
-        raise TypeError
-    try:
-        res = rget(CONFIG_FILE_URL)
-        if res.status_code == 200:
-            with open('config.env', 'wb+') as f:
-                f.write(res.content)
-        else:
-            logger.error(f"Failed to download config.env {res.status_code}")
-    except Exception as e:
-        logger.error(f"CONFIG_FILE_URL: {e}")
-except:
-    pass
-
 load_dotenv('config.env', override=True)
 
 UPSTREAM_REPO = environ.get('UPSTREAM_REPO', '')
@@ -38,8 +23,8 @@ update = srun([f"git init -q \
                  && git add . \
                  && git commit -sm update -q \
                  && git remote add origin {UPSTREAM_REPO} \
-                 && git fetch origin -q \
-                 && git reset --hard origin/{UPSTREAM_BRANCH} -q"], shell=True)
+                 && git fetch --depth 1 origin {UPSTREAM_BRANCH} -q \
+                 && git reset --hard FETCH_HEAD -q"], shell=True)
 
 if update.returncode == 0:
     logger.info('Successfully updated with latest commit from UPSTREAM_REPO')
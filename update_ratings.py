@@ -3,7 +3,8 @@ import asyncio
 import logging
 from motor.motor_asyncio import AsyncIOMotorClient
 from tmdb import get_info
-from config import MONGO_URI, TMDB_API_KEY
+from rate_limiter import PRIORITY_BULK
+from config import MONGO_URI, DATABASE_NAME, TMDB_API_KEY
 
 # Configure logging
 logging.basicConfig(
@@ -26,7 +27,7 @@ async def main():
 
     try:
         client = AsyncIOMotorClient(mongo_uri)
-        db = client["sharing_bot"]
+        db = client[DATABASE_NAME]
         tmdb_col = db["tmdb"]
         logger.info("Successfully connected to the database.")
     except Exception as e:
@@ -56,7 +57,7 @@ async def main():
                 logger.info(
                     f"({i+1}/{total_docs}) Fetching info for {tmdb_type}/{tmdb_id}..."
                 )
-                info = await get_info(tmdb_type, tmdb_id)
+                info = await get_info(tmdb_type, tmdb_id, priority=PRIORITY_BULK)
 
                 if info and not info.get("message", "").startswith("Error"):
                     update_data = {
@@ -78,8 +79,6 @@ async def main():
                         f"Failed to fetch or got error for {tmdb_type}/{tmdb_id}. Response: {info}"
                     )
 
-                await asyncio.sleep(1)  # basic rate-limit protection
-
             except Exception as e:
                 logger.error(
                     f"An error occurred while processing {tmdb_type}/{tmdb_id}: {e}"
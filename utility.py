@@ -4,9 +4,9 @@ import aiohttp
 import asyncio
 import base64
 import uuid
-import os
 import logging
-import imgbbpy
+from cachetools import TTLCache, TLRUCache, LRUCache
+from pymongo import UpdateOne
 from datetime import datetime, timezone, timedelta
 from pyrogram.errors import (FloodWait, UserNotParticipant, UserIsBlocked,
                               InputUserDeactivated, PeerIdInvalid, UserIsBot, 
@@ -22,62 +22,19 @@ from db import (
     tmdb_col
 )
 from config import *
-from mutagen.mp3 import MP3
-from mutagen.flac import FLAC
-from mutagen.mp4 import MP4
-from mutagen.id3 import ID3, APIC
-from mutagen import File as MutagenFile
-from cache import invalidate_cache
+from filename_parser import clean_file_name
+from audio_cover import extract_audio_cover
+import send_scheduler
+from metrics import http_trace_config, telegram_calls, telegram_flood_wait_seconds
 
 
-async def upload_to_imgbb(image_url):
-    """
-    Downloads an image, uploads it to imgbb, and returns the new URL.
-    """
-    if not image_url:
-      raise ValueError("Image URL cannot be empty.")
-
-    temp_file_path = f"/tmp/{uuid.uuid4()}.jpg"
-    client = None
-    try:
-        # 1. Download the image
-        async with aiohttp.ClientSession() as session:
-            async with session.get(image_url) as response:
-                if response.status != 200:
-                    raise ValueError(f"Failed to download image from URL: Status {response.status}")
-                with open(temp_file_path, "wb") as f:
-                    while True:
-                        chunk = await response.content.read(1024)
-                        if not chunk:
-                            break
-                        f.write(chunk)
-
-        # 2. Upload the local file
-        client = imgbbpy.AsyncClient(IMGBB_API_KEY)
-        image = await client.upload(file=temp_file_path)
-        # After image = await client.upload(file=temp_file_path)
-        return {
-                "url": image.url,
-                "delete_url": getattr(image, "delete_url", None)
-        }
-
-    except Exception as e:
-        logger.error(f"Error during imgbb upload process: {e}")
-        raise ValueError(f"Failed to upload image to imgbb: {e}")
-
-    finally:
-        # 3. Clean up resources
-        if client:
-            await client.close()
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-
 # =========================
 # Constants & Globals
 # =========================
 
 TOKEN_VALIDITY_SECONDS = 24 * 60 * 60  # 24 hours
 AUTO_DELETE_SECONDS = 2 * 60
+SHORTENER_TIMEOUT_SECONDS = 5
 
 logger = logging.getLogger(__name__)
 
@@ -150,33 +107,80 @@ def build_search_pipeline(query, match_query, skip, limit):
 # Channel & User Utilities
 # =========================
 
-async def get_allowed_channels():
-    return [
+# Process-wide copy of allowed_channels_col, checked for every channel post
+allowed_channel_ids = set()
+
+async def load_allowed_channels():
+    """(Re)loads the allowed channel ids from the database."""
+    channel_ids = {
         doc["channel_id"]
         async for doc in allowed_channels_col.find({}, {"_id": 0, "channel_id": 1})
-    ]
+    }
+    allowed_channel_ids.clear()
+    allowed_channel_ids.update(channel_ids)
+    return allowed_channel_ids
 
-async def add_user(user_id):
+def is_allowed_channel(channel_id):
+    return channel_id in allowed_channel_ids
+
+async def add_allowed_channel(channel_id, channel_name):
+    await allowed_channels_col.update_one(
+        {"channel_id": channel_id},
+        {"$set": {"channel_id": channel_id, "channel_name": channel_name}},
+        upsert=True
+    )
+    allowed_channel_ids.add(channel_id)
+
+async def remove_allowed_channel(channel_id):
+    """Returns False if the channel was not allowed."""
+    result = await allowed_channels_col.delete_one({"channel_id": channel_id})
+    allowed_channel_ids.discard(channel_id)
+    return bool(result.deleted_count)
+
+async def periodic_allowed_channels_refresh(interval_seconds=ALLOWED_CHANNELS_REFRESH_SECONDS):
+    """Picks up channels changed directly in the database. Disabled when the interval is 0."""
+    if interval_seconds <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await load_allowed_channels()
+        except Exception as e:
+            logger.error(f"Failed to refresh allowed channels: {e}")
+
+async def add_user(user_id, first_name=None, username=None):
     """
     Add a user to users_col only if not already present.
-    Stores user_id, joined_date (UTC), and blocked status.
+    Stores user_id, joined_date (UTC), blocked status and the profile names,
+    which are refreshed when they changed since the last /start.
     Returns the user document with an extra key '_new' (True if newly added).
     """
     user_doc = await users_col.find_one({"user_id": user_id})
+    now = datetime.now(timezone.utc)
     
     if not user_doc:
         user_doc = {
             "user_id": user_id,
-            "joined": datetime.now(timezone.utc),
-            "blocked": False
+            "joined": now,
+            "blocked": False,
+            "first_name": first_name,
+            "username": username,
+            "profile_updated_at": now
         }
 
         await users_col.insert_one(user_doc)
 
         user_doc["_new"] = True
     else:
+        if first_name and (user_doc.get("first_name"), user_doc.get("username")) != (first_name, username):
+            await users_col.update_one(
+                {"user_id": user_id},
+                {"$set": {"first_name": first_name, "username": username, "profile_updated_at": now}}
+            )
         user_doc["_new"] = False
-    
+
+    if first_name:
+        cache_user_profile(user_id, first_name, username, now)
     return user_doc
 
 
@@ -222,14 +226,109 @@ async def get_user_link(user: User) -> str:
     else:
         return first_name
 
-async def get_user_firstname(user_id: int) -> str:
-    """Gets a user's first name from the bot's API."""
+# =========================
+# User Profile Cache
+# =========================
+# First names for the web API come from users_col (written on /start) through
+# an in-memory LRU. Unknown or stale profiles are fetched from Telegram in
+# batches of up to PROFILE_BATCH_SIZE ids per get_users call. Ids a batch
+# could not resolve are remembered for a while so they are not asked again
+# on every request.
+
+PROFILE_STALE_SECONDS = 24 * 60 * 60
+PROFILE_BATCH_SIZE = 200
+PROFILE_BATCH_DELAY_SECONDS = 0.5  # lets concurrent requests join one batch
+PROFILE_UNRESOLVED_SECONDS = 10 * 60
+
+user_profiles = LRUCache(maxsize=20000)  # user_id -> {"first_name", "username", "updated_at"}
+unresolved_profiles = TTLCache(maxsize=20000, ttl=PROFILE_UNRESOLVED_SECONDS)  # user_id -> True
+_profile_waiters = {}  # user_id -> Future resolved with the refreshed profile
+_profile_refresh_task = None
+
+def cache_user_profile(user_id, first_name, username, updated_at=None):
+    updated_at = updated_at or datetime.now(timezone.utc)
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    unresolved_profiles.pop(user_id, None)
+    profile = user_profiles[user_id] = {"first_name": first_name, "username": username, "updated_at": updated_at}
+    return profile
+
+def _is_stale(profile):
+    return (datetime.now(timezone.utc) - profile["updated_at"]).total_seconds() > PROFILE_STALE_SECONDS
+
+def request_profile_refresh(user_id):
+    """Queues a user for the next batched get_users call. Returns a future for the profile."""
+    global _profile_refresh_task
+    future = _profile_waiters.get(user_id)
+    if future is None:
+        future = _profile_waiters[user_id] = asyncio.get_running_loop().create_future()
+    if _profile_refresh_task is None or _profile_refresh_task.done():
+        _profile_refresh_task = asyncio.create_task(_refresh_profiles())
+    return future
+
+async def _fetch_users(bot, user_ids):
+    """Returns the users get_users resolves. A failed call is split in half so one bad id only loses itself."""
+    try:
+        users = await safe_api_call(lambda: bot.get_users(user_ids))
+    except Exception as e:
+        logger.warning(f"get_users failed for {len(user_ids)} ids: {e}")
+        users = None
+    if users is not None:
+        return users
+    if len(user_ids) == 1:
+        return []
+    middle = len(user_ids) // 2
+    return await _fetch_users(bot, user_ids[:middle]) + await _fetch_users(bot, user_ids[middle:])
+
+async def _refresh_profiles():
     from app import bot
+    await asyncio.sleep(PROFILE_BATCH_DELAY_SECONDS)
+    while _profile_waiters:
+        batch = {}
+        for user_id in list(_profile_waiters)[:PROFILE_BATCH_SIZE]:
+            batch[user_id] = _profile_waiters.pop(user_id)
+        users = await _fetch_users(bot, list(batch))
+        resolved = {user.id for user in users}
+        now = datetime.now(timezone.utc)
+        operations = []
+        for user in users:
+            cache_user_profile(user.id, user.first_name, user.username, now)
+            operations.append(UpdateOne(
+                {"user_id": user.id},
+                {"$set": {"first_name": user.first_name, "username": user.username, "profile_updated_at": now}}
+            ))
+        if operations:
+            try:
+                await users_col.bulk_write(operations, ordered=False)
+            except Exception as e:
+                logger.error(f"Error saving {len(operations)} user profiles: {e}")
+        for user_id, future in batch.items():
+            if user_id not in resolved:
+                unresolved_profiles[user_id] = True
+            if not future.done():
+                future.set_result(user_profiles.get(user_id))
+
+async def get_user_firstname(user_id: int) -> str:
+    """Gets a user's first name, from memory or users_col when possible."""
+    if user_id == OWNER_ID:
+        return "ADMIN"
     try:
-        if user_id == OWNER_ID:
-          return "ADMIN"
-        user = await bot.get_users(user_id)
-        return user.first_name
+        profile = user_profiles.get(user_id)
+        if profile is None and user_id in unresolved_profiles:
+            return "Anonymous"
+        if profile is None:
+            doc = await users_col.find_one(
+                {"user_id": user_id}, {"_id": 0, "first_name": 1, "username": 1, "profile_updated_at": 1}
+            )
+            if doc and doc.get("first_name"):
+                profile = cache_user_profile(user_id, doc["first_name"], doc.get("username"), doc.get("profile_updated_at"))
+        if profile is None:
+            # Never seen this profile, wait for the next batch
+            profile = await request_profile_refresh(user_id)
+            return profile["first_name"] if profile else "Anonymous"
+        if _is_stale(profile) and user_id not in unresolved_profiles:
+            request_profile_refresh(user_id)
+        return profile["first_name"]
     except Exception as e:
         logger.error(f"Error getting user's first name: {e}")
         return "Anonymous"
@@ -267,20 +366,78 @@ def get_token_link(token_id, bot_username):
     """Generate a Telegram deep link for a token."""
     return f"https://telegram.dog/{bot_username}?start=token_{token_id}"
 
+# user_id -> (shortened verify link, token expiry)
+verify_links = TTLCache(maxsize=10000, ttl=TOKEN_VALIDITY_SECONDS)
+
+async def get_verify_link(user_id, bot_username):
+    """
+    Returns the shortened verify link for the user's unexpired token, creating
+    the token if needed. Short links are stored with the token and cached in
+    memory, so the shortener is only called once per token.
+    """
+    now = datetime.now(timezone.utc)
+    cached = verify_links.get(user_id)
+    if cached and cached[1] > now:
+        return cached[0]
+
+    token_doc = await tokens_col.find_one({"user_id": user_id, "expiry": {"$gt": now}})
+    if token_doc:
+        token_id, expiry = token_doc["token_id"], token_doc["expiry"]
+        if expiry.tzinfo is None:
+            expiry = expiry.replace(tzinfo=timezone.utc)
+        short_link = token_doc.get("short_link")
+    else:
+        token_id = await generate_token(user_id)
+        expiry = now + timedelta(seconds=TOKEN_VALIDITY_SECONDS)
+        short_link = None
+
+    if not short_link:
+        raw_link = get_token_link(token_id, bot_username)
+        short_link = await shorten_url(raw_link)
+        if short_link == raw_link:
+            # Shortener unavailable, try again on the next /start
+            return raw_link
+        await tokens_col.update_one({"token_id": token_id}, {"$set": {"short_link": short_link}})
+
+    verify_links[user_id] = (short_link, expiry)
+    return short_link
+
+MEMBERSHIP_TTL_SECONDS = 6 * 60 * 60    # members rarely leave, and leaving is pushed to us
+NON_MEMBERSHIP_TTL_SECONDS = 60         # recheck soon after asking a user to join
+LEFT_STATUSES = (enums.ChatMemberStatus.LEFT, enums.ChatMemberStatus.BANNED)
+
+# user_id -> True/False, membership of UPDATE_CHANNEL_ID
+membership_cache = TLRUCache(
+    maxsize=50000,
+    ttu=lambda _key, is_member, now: now + (MEMBERSHIP_TTL_SECONDS if is_member else NON_MEMBERSHIP_TTL_SECONDS),
+)
+
+def set_membership(user_id, is_member):
+    """Records a known membership change of the updates channel."""
+    membership_cache[user_id] = is_member
+
+def is_member_status(member):
+    return member is not None and member.status not in LEFT_STATUSES
+
 async def is_user_subscribed(client, user_id):
         """Check if a user is subscribed to backup channel."""
         if not BACKUP_CHANNEL_LINK:
             return True  # No backup channel configured, consider all subscribed
+        cached = membership_cache.get(user_id)
+        if cached is not None:
+            return cached
         try:
             member = await client.get_chat_member(UPDATE_CHANNEL_ID, user_id)
-            return not member.status == 'kicked'
+            subscribed = is_member_status(member)
         except UserNotParticipant:
-            return False
+            subscribed = False
         except ChatAdminRequired:
             return False
         except Exception as e:
             logger.error(f"{e}")
             return False
+        membership_cache[user_id] = subscribed
+        return subscribed
 # =========================
 # Link & URL Utilities
 # =========================
@@ -304,10 +461,10 @@ def extract_channel_and_msg_id(link):
         return channel_id, msg_id
     raise ValueError("Invalid Telegram message link format. Only /c/ links are supported.")
 
-async def shorten_url(url):
+async def shorten_url(url, timeout=SHORTENER_TIMEOUT_SECONDS):
     """
     Shorten a URL using the configured shortener service.
-    Returns the original URL if shortening fails.
+    Returns the original URL if shortening fails or takes longer than `timeout` seconds.
     """
     try:
         api_url = f"https://{SHORTERNER_URL}/api"
@@ -317,15 +474,20 @@ async def shorten_url(url):
             "format": "text"
         }
 
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=timeout), trace_configs=[http_trace_config]
+        ) as session:
             async with session.get(api_url, params=params) as response:
                 if response.status == 200:
-                    return (await response.text()).strip()
+                    return (await response.text()).strip() or url
                 else:
                     logger.error(
                         f"URL shortening failed. Status code: {response.status}, Response: {await response.text()}"
                     )
                     return url
+    except asyncio.TimeoutError:
+        logger.warning(f"URL shortening timed out after {timeout}s, using the original link.")
+        return url
     except Exception as e:
         logger.error(f"URL shortening failed: {e}")
         return url
@@ -341,6 +503,13 @@ async def upsert_file_info(file_info):
         upsert=True
     )
 
+def get_media_ids(message):
+    """Returns (file_id, file_unique_id) of the message's document, video, audio or photo."""
+    media = message.document or message.video or message.audio or message.photo
+    if not media:
+        return None, None
+    return media.file_id, media.file_unique_id
+
 def extract_file_info(message, channel_id=None):
     """Extract file info from a Pyrogram message."""
     caption_name = message.caption.strip() if message.caption else None
@@ -368,11 +537,51 @@ def extract_file_info(message, channel_id=None):
         file_info["file_size"] = getattr(message.photo, "file_size", None)
         file_info["file_format"] = "image/jpeg"
     if file_info["file_name"]:
-        file_info["file_name"] = remove_extension(
-            re.sub(r"[',]", "", file_info["file_name"].replace("&", "and")).split("\n")[0]
-        )
+        file_info["file_name"] = clean_file_name(file_info["file_name"])
+        # Lets delivery send the cached media directly instead of copying the message
+        file_info["file_id"], file_info["file_unique_id"] = get_media_ids(message)
     return file_info
 
+async def iter_message_batches(client, channel_id, start_id, end_id, min_batch=50, max_batch=200):
+    """
+    Yields the non-empty messages of [start_id, end_id] batch by batch.
+    The next batch is fetched while the caller handles the current one, and
+    the batch size grows over stretches of deleted/empty ids.
+    """
+    batch_size = min_batch
+    next_id = start_id
+
+    async def fetch(ids):
+        try:
+            return await safe_api_call(lambda: client.get_messages(channel_id, ids)) or []
+        except Exception as e:
+            logger.warning(f"Could not get messages in batch {ids[0]}-{ids[-1]}: {e}")
+            return []
+
+    def prefetch():
+        nonlocal next_id
+        if next_id > end_id:
+            return None
+        ids = list(range(next_id, min(next_id + batch_size - 1, end_id) + 1))
+        next_id = ids[-1] + 1
+        return ids, asyncio.create_task(fetch(ids))
+
+    pending = prefetch()
+    try:
+        while pending:
+            ids, task = pending
+            messages = [msg for msg in await task if msg and not msg.empty]
+            density = len(messages) / len(ids)
+            if density < 0.25:
+                batch_size = min(max_batch, batch_size * 2)
+            elif density > 0.75:
+                batch_size = max(min_batch, batch_size // 2)
+            pending = prefetch()
+            yield messages
+    finally:
+        if pending:
+            pending[1].cancel()
+
 def human_readable_size(size):
     for unit in ['B','KB','MB','GB','TB']:
         if size < 1024:
@@ -380,47 +589,40 @@ def human_readable_size(size):
         size /= 1024
     return f"{size:.2f} PB"
 
-def remove_extension(caption):
-    try:
-        # Remove the extension and everything after it
-        cleaned_caption = re.sub(r'\.(mkv|mp4|webm).*$', '', caption, flags=re.IGNORECASE)
-        return cleaned_caption
-    except Exception as e:
-        logger.error(e)
-        return None
-    
-def remove_unwanted(caption):
-    try:
-        # Match and keep everything up to and including the extension
-        match = re.match(r'^(.*?\.(mkv|mp4|webm))', caption, flags=re.IGNORECASE)
-        if match:
-            return match.group(1)
-        return caption  # Return original if no match
-    except Exception as e:
-        logger.error(e)
-        return None
-
 # =========================
 # Async/Bot Utilities
 # =========================
-async def safe_api_call(coro_factory, max_retries=3):
-    """Utility wrapper to add delay and retry for flood waits."""
+async def safe_api_call(coro_factory, max_retries=3, chat_id=None):
+    """
+    Utility wrapper that paces calls through the send scheduler and retries flood waits.
+    Pass `chat_id` when the call targets a chat so that chat gets its own rate.
+    """
+    # Calls without a chat are told apart by where they are made
+    caller = getattr(coro_factory, "__code__", None) if chat_id is None else None
     retries = 0
     while retries < max_retries:
+        await send_scheduler.acquire(chat_id, caller)
         try:
-            return await coro_factory()
+            result = await coro_factory()
+            send_scheduler.on_success(chat_id, caller)
+            telegram_calls.inc(outcome="ok")
+            return result
         except (UserIsBlocked, InputUserDeactivated, PeerIdInvalid, UserIsBot) as e:
+            telegram_calls.inc(outcome="unreachable")
             raise e
         except FloodWait as e:
             retries += 1
+            telegram_calls.inc(outcome="flood_wait")
+            telegram_flood_wait_seconds.inc(e.value)
+            # The scheduler holds back further calls until the wait is over
+            send_scheduler.on_flood_wait(e.value, chat_id, caller)
             if retries < max_retries:
-                sleep_duration = e.value * 1.2
-                logger.warning(f"FloodWait: Sleeping for {sleep_duration:.2f} seconds before retrying. Attempt {retries}/{max_retries}")
-                await asyncio.sleep(sleep_duration)
+                logger.warning(f"FloodWait: Waiting {e.value} seconds before retrying. Attempt {retries}/{max_retries}")
             else:
                 logger.error(f"FloodWait limit reached after {max_retries} attempts. Giving up. {e}")
                 return None
         except Exception as e:
+            telegram_calls.inc(outcome="error")
             logger.error(f"An error occurred during an API call: {e}")
             return None
     return None
@@ -459,15 +661,9 @@ async def extract_tmdb_link(tmdb_url):
     return tmdb_type, tmdb_id
         
 # =========================
-# Queue System for File Processing
+# File Processing Helpers
 # =========================
 
-file_queue = asyncio.PriorityQueue()
-
-def get_queue_size():
-    """Returns the current size of the file processing queue."""
-    return file_queue.qsize()
-
 async def handle_duplicate_file(bot, file_info, log_duplicate: bool):
     """Checks for duplicate files and logs if requested."""
     existing = await files_col.find_one({"file_name": file_info["file_name"]})
@@ -477,71 +673,31 @@ async def handle_duplicate_file(bot, file_info, log_duplicate: bool):
             telegram_link = generate_c_link(
                 file_info["channel_id"], file_info["message_id"]
             )
-            await asyncio.sleep(3)
             await safe_api_call(
                 lambda: bot.send_message(
                     LOG_CHANNEL_ID,
                     f"⚠️ Duplicate File.\nLink: {telegram_link}",
                     parse_mode=enums.ParseMode.HTML,
-                )
+                ),
+                chat_id=LOG_CHANNEL_ID,
             )
         return True
     return False
 
 async def process_audio_file(bot, message):
-    """Processes audio files: downloads, gets thumbnail, sends info, and cleans up."""
+    """Posts the embedded cover of an audio file with its title and artist."""
     try:
-        audio_path = await bot.download_media(message)
-        thumb_path = await get_audio_thumbnail(audio_path)
-        if thumb_path:
+        cover = await extract_audio_cover(bot, message)
+        if cover:
             file_info_text = f"🎧 <b>Title:</b> {message.audio.title}\n🧑‍🎤 <b>Artist:</b> {message.audio.performer}"
-            await bot.send_photo(UPDATE_CHANNEL_ID2, photo=thumb_path, caption=file_info_text)
-            os.remove(thumb_path)
-        os.remove(audio_path)
+            await safe_api_call(
+                lambda: bot.send_photo(UPDATE_CHANNEL_ID2, photo=cover, caption=file_info_text),
+                chat_id=UPDATE_CHANNEL_ID2,
+            )
     except Exception as e:
         logger.error(f"Error processing audio file: {e}")
 
 
-async def file_queue_worker(bot):
-    from tmdb import process_tmdb_info
-    while True:
-        _priority, item = await file_queue.get()
-        file_info, _, message, log_duplicate = item
-        try:
-            if await handle_duplicate_file(bot, file_info, log_duplicate):
-                continue
-
-            # Process TMDB info before upserting
-            await process_tmdb_info(bot, file_info)
-
-            # Upsert file_info after TMDB processing
-            await upsert_file_info(file_info)
-
-            if message.audio:
-                await process_audio_file(bot, message)
-
-        except Exception as e:
-            logger.error(f"❌ Error saving file: {e}")
-        finally:
-            file_queue.task_done()
-            invalidate_cache()
-
-# =========================
-# Unified File Queueing
-# =========================
-
-async def queue_file_for_processing(
-    message, channel_id=None, reply_func=None, log_duplicates=True
-):
-    try:
-        file_info = extract_file_info(message, channel_id=channel_id)
-        if file_info["file_name"]:
-            item = (file_info, reply_func, message, log_duplicates)
-            await file_queue.put((message.id, item))
-    except Exception as e:
-        if reply_func:
-            await safe_api_call(lambda: reply_func(f"❌ Error queuing file: {e}"))
-
 async def delete_expired_auth_users():
     """
     Delete expired auth users from auth_users_col using 'expiry' field.
@@ -566,62 +722,3 @@ async def periodic_expiry_cleanup(interval_seconds=3600 * 4):
         await delete_expired_auth_users()
         await delete_expired_tokens()
         await asyncio.sleep(interval_seconds)
-
-
-def remove_redandent(filename):
-    """
-    Remove common username patterns from a filename while preserving the content title.
-
-    Args:
-        filename (str): The input filename
-
-    Returns:
-        str: Filename with usernames removed
-    """
-    filename = filename.replace("\n", "\\n")
-
-    patterns = [
-        r"^@[\w\.-]+?(?=_)",
-        r"_@[A-Za-z]+_|@[A-Za-z]+_|[\[\]\s@]*@[^.\s\[\]]+[\]\[\s@]*",  
-        r"^[\w\.-]+?(?=_Uploads_)",  
-        r"^(?:by|from)[\s_-]+[\w\.-]+?(?=_)",  
-        r"^\[[\w\.-]+?\][\s_-]*",  
-        r"^\([\w\.-]+?\)[\s_-]*",  
-    ]
-
-    result = filename
-    for pattern in patterns:
-        match = re.search(pattern, result)
-        if match:
-            result = re.sub(pattern, " ", result)
-            break  
-
-    
-    result = re.sub(r"^[_\s-]+|[_\s-]+$", " ", result)
-
-    return result
-
-async def get_audio_thumbnail(audio_path, output_dir="downloads"):
-    audio = MutagenFile(audio_path)
-    thumbnail_path = os.path.join(output_dir, "audio_thumbnail.jpg")
-
-    if isinstance(audio, MP3):
-        if audio.tags and isinstance(audio.tags, ID3):
-            for tag in audio.tags.values():
-                if isinstance(tag, APIC):
-                    with open(thumbnail_path, "wb") as img_file:
-                        img_file.write(tag.data)
-                    return thumbnail_path
-    elif isinstance(audio, FLAC):
-        if audio.pictures:
-            with open(thumbnail_path, "wb") as img_file:
-                img_file.write(audio.pictures[0].data)
-            return thumbnail_path
-    elif isinstance(audio, MP4):
-        if audio.tags and 'covr' in audio.tags:
-            cover = audio.tags['covr'][0]
-            with open(thumbnail_path, "wb") as img_file:
-                img_file.write(cover)
-            return thumbnail_path
-    
-    return None
@@ -0,0 +1,53 @@
+import time
+import asyncio
+import logging
+from db import tmdb_col
+from cache import cache
+from fast_api import get_media, get_media_details
+from config import OWNER_ID, WARMUP_PAGES, WARMUP_TOP_TITLES, WARMUP_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Startup Cache Warm-up
+# =========================
+# Fills the response cache with what the index page asks for first (every
+# category x sort for the first pages) and the details of the newest titles,
+# by calling the route functions directly with the same arguments the
+# frontend sends, so the cache keys match.
+
+CATEGORIES = ("movie", "tv")
+SORTS = ("recent", "rating", "year")
+
+async def warm_caches():
+    started = time.perf_counter()
+    before = len(cache)
+    semaphore = asyncio.Semaphore(WARMUP_CONCURRENCY)
+    failed = 0
+
+    async def warm(route, **params):
+        nonlocal failed
+        async with semaphore:
+            try:
+                await route(user_id=OWNER_ID, **params)
+            except Exception as e:
+                failed += 1
+                logger.warning(f"Cache warm-up of {route.__name__} {params} failed: {e}")
+
+    jobs = [
+        warm(get_media, page=page, search="", category=category, sort=sort, genre=None, cast=None, director=None)
+        for category in CATEGORIES
+        for sort in SORTS
+        for page in range(1, WARMUP_PAGES + 1)
+    ]
+    top_titles = tmdb_col.find({}, {"_id": 0, "tmdb_id": 1, "tmdb_type": 1}).sort("_id", -1).limit(WARMUP_TOP_TITLES)
+    async for title in top_titles:
+        jobs.append(warm(get_media_details, tmdb_id=str(title["tmdb_id"]), tmdb_type=title["tmdb_type"], page=1))
+
+    await asyncio.gather(*jobs)
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Cache warm-up: {len(cache) - before} entries in {elapsed:.2f}s "
+        f"({len(jobs)} requests, {failed} failed)"
+    )
+    return {"entries": len(cache) - before, "requests": len(jobs), "failed": failed, "seconds": elapsed}